@@ -1,10 +1,268 @@
+"""
+Settings
+
+Environment settings are grouped in sections (`settings.web`,
+`settings.newsbot`, `settings.profilebot`, `settings.db`,
+`settings.auth`). A section reads and validates its variables on first
+access, and .env is loaded the first time any section is used, so a
+process only pays for and only needs the variables it uses: the website
+starts without the bot tokens.
+
+The old module constants (`from config import ADMIN_CHAT_ID`) still work
+and resolve through the sections.
+"""
 import os
+from dataclasses import dataclass
+from functools import cached_property
 
 DATABASE_NAME = "users.db"
 SESSION_PROTECTION = 'strong'
 REMEMBER_COOKIE_DURATION = 3600
-NEWS_BOT_TOKEN = os.getenv('NEWS_BOT_TOKEN')
-ADMIN_CHAT_ID = int(os.getenv('ADMIN_CHAT_ID'))
-NEWS_CHANNEL_ID = os.getenv('NEWS_CHANNEL_ID')
-PROFILE_BOT_TOKEN = os.getenv('PROFILE_BOT_TOKEN')
 NEWS_JSON_FILE = "news.json"
+NEWS_LOG_FILE = "news.jsonl"
+
+
+class ConfigError(ValueError):
+    """A required setting is missing or invalid"""
+
+
+_dotenv_loaded = False
+
+
+def load_dotenv():
+    """Load .env into the environment once, variables already set win"""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    _dotenv_loaded = True
+    try:
+        import dotenv
+    except ImportError:
+        return
+    dotenv.load_dotenv(override=False)
+
+
+def env(name, default=None, cast=str, required=False, check=None):
+    """
+    Read and convert an environment variable
+
+    Args:
+        name (str): Variable name
+        default: Value used when the variable is unset or empty
+        cast (callable): Conversion, e.g. int
+        required (bool): Raise ConfigError when the variable is unset
+        check (callable): Validation of the converted value
+
+    Returns:
+        The converted value
+    """
+    value = os.getenv(name)
+    if value is None or value == '':
+        if required:
+            raise ConfigError(f"{name} is not set, add it to the environment or .env")
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ConfigError(f"{name}={value!r} is not a valid {cast.__name__}") from None
+    if check is not None and not check(value):
+        raise ConfigError(f"{name}={value!r} is out of range")
+    return value
+
+
+def positive(value):
+    return value > 0
+
+
+def comma_list(value):
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+@dataclass(frozen=True)
+class WebSettings:
+    host: str
+    port: int
+    workers: int
+    graceful_timeout: int
+    status_refresh_interval: int
+    status_shared_file: str
+    rate_limit_rate: float
+    rate_limit_burst: int
+    rate_limit_db: str
+    blocklist_file: str
+    trusted_proxies: tuple
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            host=env('WEB_HOST', '0.0.0.0'),
+            port=env('WEB_PORT', 8000, int, check=lambda value: 0 < value < 65536),
+            workers=env('WEB_WORKERS', os.cpu_count() or 1, int, check=positive),
+            # Seconds a worker gets to finish open requests on shutdown or restart
+            graceful_timeout=env('WEB_GRACEFUL_TIMEOUT', 30, int, check=positive),
+            status_refresh_interval=env('STATUS_REFRESH_INTERVAL', 30, int, check=positive),
+            # Set by website.serve so only one worker probes the services
+            status_shared_file=env('STATUS_SHARED_FILE'),
+            rate_limit_rate=env('RATE_LIMIT_RATE', 10.0, float, check=positive),
+            rate_limit_burst=env('RATE_LIMIT_BURST', 40, int, check=positive),
+            # SQLite file for bans shared between workers, bans stay per process if unset
+            rate_limit_db=env('RATE_LIMIT_DB'),
+            blocklist_file=env('BLOCKLIST_FILE'),
+            # Reverse proxies whose X-Forwarded-For is used and which are never banned,
+            # comma separated addresses or networks
+            trusted_proxies=env('TRUSTED_PROXIES', ('127.0.0.1', '::1'), comma_list),
+        )
+
+
+@dataclass(frozen=True)
+class NewsbotSettings:
+    token: str
+    admin_chat_id: int
+    channel_id: str
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            token=env('NEWS_BOT_TOKEN', required=True),
+            admin_chat_id=env('ADMIN_CHAT_ID', cast=int, required=True),
+            channel_id=env('NEWS_CHANNEL_ID', required=True),
+        )
+
+
+@dataclass(frozen=True)
+class ProfilebotSettings:
+    token: str
+
+    @classmethod
+    def from_env(cls):
+        return cls(token=env('PROFILE_BOT_TOKEN'))
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    url: str
+    pool_size: int
+    max_overflow: int
+    pool_timeout: int
+    pool_recycle: int
+    sqlite_busy_timeout: int
+    sqlite_cache_size: int
+    sqlite_mmap_size: int
+    user_cache_size: int
+    user_cache_ttl: float
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            # sqlite:///users.db by default, set to a postgresql:// URL to move off SQLite
+            url=env('DATABASE_URL', f"sqlite:///{DATABASE_NAME}"),
+            pool_size=env('DB_POOL_SIZE', 5, int, check=positive),
+            max_overflow=env('DB_MAX_OVERFLOW', 10, int, check=lambda value: value >= 0),
+            pool_timeout=env('DB_POOL_TIMEOUT', 30, int, check=positive),
+            pool_recycle=env('DB_POOL_RECYCLE', 1800, int),
+            sqlite_busy_timeout=env('SQLITE_BUSY_TIMEOUT', 5000, int, check=lambda value: value >= 0),  # milliseconds
+            sqlite_cache_size=env('SQLITE_CACHE_SIZE', -20000, int),  # negative means KiB
+            sqlite_mmap_size=env('SQLITE_MMAP_SIZE', 256 * 1024 * 1024, int, check=lambda value: value >= 0),
+            # User lookups cached per process, entries expire after user_cache_ttl seconds
+            user_cache_size=env('USER_CACHE_SIZE', 4096, int, check=positive),
+            user_cache_ttl=env('USER_CACHE_TTL', 60.0, float, check=lambda value: value >= 0),
+        )
+
+
+@dataclass(frozen=True)
+class AuthSettings:
+    # scrypt, pbkdf2 or argon2 (needs argon2-cffi), older hashes are upgraded on login
+    password_hash_method: str
+    password_hash_workers: int
+    scrypt_n: int
+    scrypt_r: int
+    scrypt_p: int
+    pbkdf2_iterations: int
+    argon2_time_cost: int
+    argon2_memory_cost: int
+    argon2_parallelism: int
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            password_hash_method=env('PASSWORD_HASH_METHOD', 'scrypt',
+                                     check=lambda value: value in ('scrypt', 'pbkdf2', 'argon2')),
+            password_hash_workers=env('PASSWORD_HASH_WORKERS', 2, int, check=positive),
+            scrypt_n=env('PASSWORD_SCRYPT_N', 2 ** 15, int, check=lambda value: value > 1 and value & (value - 1) == 0),
+            scrypt_r=env('PASSWORD_SCRYPT_R', 8, int, check=positive),
+            scrypt_p=env('PASSWORD_SCRYPT_P', 1, int, check=positive),
+            pbkdf2_iterations=env('PASSWORD_PBKDF2_ITERATIONS', 600000, int, check=positive),
+            argon2_time_cost=env('PASSWORD_ARGON2_TIME_COST', 3, int, check=positive),
+            argon2_memory_cost=env('PASSWORD_ARGON2_MEMORY_COST', 65536, int, check=positive),  # KiB
+            argon2_parallelism=env('PASSWORD_ARGON2_PARALLELISM', 4, int, check=positive),
+        )
+
+
+class Settings:
+    """All settings, each section is loaded on first access"""
+
+    @cached_property
+    def web(self):
+        load_dotenv()
+        return WebSettings.from_env()
+
+    @cached_property
+    def newsbot(self):
+        load_dotenv()
+        return NewsbotSettings.from_env()
+
+    @cached_property
+    def profilebot(self):
+        load_dotenv()
+        return ProfilebotSettings.from_env()
+
+    @cached_property
+    def db(self):
+        load_dotenv()
+        return DatabaseSettings.from_env()
+
+    @cached_property
+    def auth(self):
+        load_dotenv()
+        return AuthSettings.from_env()
+
+
+settings = Settings()
+
+# Old module constants and the setting each one resolves to
+LEGACY_NAMES = {
+    'DATABASE_URL': ('db', 'url'),
+    'DB_POOL_SIZE': ('db', 'pool_size'),
+    'DB_MAX_OVERFLOW': ('db', 'max_overflow'),
+    'DB_POOL_TIMEOUT': ('db', 'pool_timeout'),
+    'DB_POOL_RECYCLE': ('db', 'pool_recycle'),
+    'SQLITE_BUSY_TIMEOUT': ('db', 'sqlite_busy_timeout'),
+    'SQLITE_CACHE_SIZE': ('db', 'sqlite_cache_size'),
+    'SQLITE_MMAP_SIZE': ('db', 'sqlite_mmap_size'),
+    'USER_CACHE_SIZE': ('db', 'user_cache_size'),
+    'USER_CACHE_TTL': ('db', 'user_cache_ttl'),
+    'PASSWORD_HASH_METHOD': ('auth', 'password_hash_method'),
+    'PASSWORD_HASH_WORKERS': ('auth', 'password_hash_workers'),
+    'PASSWORD_SCRYPT_N': ('auth', 'scrypt_n'),
+    'PASSWORD_SCRYPT_R': ('auth', 'scrypt_r'),
+    'PASSWORD_SCRYPT_P': ('auth', 'scrypt_p'),
+    'PASSWORD_PBKDF2_ITERATIONS': ('auth', 'pbkdf2_iterations'),
+    'PASSWORD_ARGON2_TIME_COST': ('auth', 'argon2_time_cost'),
+    'PASSWORD_ARGON2_MEMORY_COST': ('auth', 'argon2_memory_cost'),
+    'PASSWORD_ARGON2_PARALLELISM': ('auth', 'argon2_parallelism'),
+    'NEWS_BOT_TOKEN': ('newsbot', 'token'),
+    'ADMIN_CHAT_ID': ('newsbot', 'admin_chat_id'),
+    'NEWS_CHANNEL_ID': ('newsbot', 'channel_id'),
+    'PROFILE_BOT_TOKEN': ('profilebot', 'token'),
+}
+
+
+def __getattr__(name):
+    if name not in LEGACY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    section, field = LEGACY_NAMES[name]
+    return getattr(getattr(settings, section), field)
+
+
+def __dir__():
+    return sorted(list(globals()) + list(LEGACY_NAMES))
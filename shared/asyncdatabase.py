@@ -0,0 +1,255 @@
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from shared.database import (SLUG_RETRIES, USER_BATCH_SIZE, base_slug_for, create_missing_indexes,
+                             engine_options, generate_temp_password, next_free_slug, set_sqlite_pragmas,
+                             slug_candidates_query, user_batch_query, user_count_query)
+from shared.models import Base, User, UserSummary
+from shared.passwords import hash_password_async, verify_password_async
+from shared.usercache import MISSING, UserCache
+from config import settings
+
+# Async drivers used for the URLs in config
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(database_url):
+    """Switch a database URL to its asyncio driver"""
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or '+' in url.drivername:
+        return url
+    return url.set(drivername=driver)
+
+
+def create_async_db_engine(database_url=None):
+    """Async counterpart of create_db_engine, with the same pool settings and PRAGMAs"""
+    if database_url is None:
+        database_url = settings.db.url
+    url = async_database_url(database_url)
+    engine = create_async_engine(url, **engine_options(url))
+    if url.get_backend_name() == 'sqlite':
+        set_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
+class AsyncDatabaseManager:
+    """
+    DatabaseManager for async code: FastAPI routes and the Telegram bots
+
+    Queries run on the asyncio driver and password hashing runs on the
+    bounded pool of shared.passwords, so no method blocks the event loop.
+    """
+
+    def __init__(self, database_url=None):
+        self.engine = create_async_db_engine(database_url)
+        self.SessionLocal = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+        self.user_cache = UserCache(settings.db.user_cache_size, settings.db.user_cache_ttl)
+
+    async def init_db(self):
+        """Initialize database tables"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_missing_indexes)
+
+    def get_session(self):
+        """Get database session"""
+        return self.SessionLocal()
+
+    async def session_dependency(self):
+        """FastAPI dependency that opens one session per request"""
+        async with self.SessionLocal() as session:
+            yield session
+
+    async def dispose(self):
+        """Close all pooled connections"""
+        await self.engine.dispose()
+
+    async def _get_user(self, session, **filters):
+        result = await session.execute(select(User).filter_by(**filters).limit(1))
+        return result.scalars().first()
+
+    async def create_user(self, telegram_id, telegram_username, email=None):
+        """Create a new unverified user"""
+        async with self.get_session() as session:
+            try:
+                # Check if user already exists
+                existing_user = await self._get_user(session, telegram_id=telegram_id)
+                if existing_user:
+                    return existing_user
+
+                user = User(
+                    telegram_id=telegram_id,
+                    telegram_username=telegram_username,
+                    email=email,
+                    username_slug=None,  # Will be generated on verification
+                    is_verified=False
+                )
+
+                session.add(user)
+                await session.commit()
+                await session.refresh(user)
+                self.user_cache.invalidate(telegram_id=telegram_id)
+                return user
+            except Exception as e:
+                await session.rollback()
+                raise e
+
+    async def allocate_username_slug(self, session, user):
+        """Find a free username slug for a user with one query"""
+        base_slug = base_slug_for(user)
+        query = slug_candidates_query(base_slug, user.id, self.engine.dialect.name)
+        taken = (await session.execute(query)).scalars()
+        return next_free_slug(base_slug, taken)
+
+    async def verify_user(self, telegram_id):
+        """Verify a user and generate login credentials"""
+        # Generate temporary password
+        temp_password = generate_temp_password()
+        for attempt in range(SLUG_RETRIES):
+            async with self.get_session() as session:
+                try:
+                    user = await self._get_user(session, telegram_id=telegram_id)
+                    if not user:
+                        return None
+
+                    # The unique constraint decides if another verification took the slug first
+                    username_slug = await self.allocate_username_slug(session, user)
+
+                    user.username_slug = username_slug
+                    user.password_hash = await hash_password_async(temp_password)
+                    user.verify_user()
+
+                    await session.commit()
+                    self.user_cache.invalidate(telegram_id=telegram_id, username_slug=username_slug)
+                    return {
+                        'user': user,
+                        'temp_password': temp_password,
+                        'username': username_slug
+                    }
+                except IntegrityError:
+                    await session.rollback()
+                    if attempt == SLUG_RETRIES - 1:
+                        raise
+                except Exception as e:
+                    await session.rollback()
+                    raise e
+
+    async def change_password(self, username_slug, new_password):
+        """Change user password"""
+        async with self.get_session() as session:
+            try:
+                user = await self._get_user(session, username_slug=username_slug)
+                if user:
+                    user.password_hash = await hash_password_async(new_password)
+                    await session.commit()
+                    self.user_cache.invalidate(username_slug=username_slug)
+                    return True
+                return False
+            except Exception as e:
+                await session.rollback()
+                raise e
+
+    async def authenticate(self, username_slug, password):
+        """Async version of DatabaseManager.authenticate"""
+        async with self.get_session() as session:
+            try:
+                user = await self._get_user(session, username_slug=username_slug)
+                if not user or not await verify_password_async(user.password_hash, password):
+                    return None
+                if user.password_needs_rehash():
+                    user.password_hash = await hash_password_async(password)
+                    await session.commit()
+                return user
+            except Exception as e:
+                await session.rollback()
+                raise e
+
+    async def _get_user_snapshot(self, key, **filters):
+        snapshot = self.user_cache.get(key)
+        if snapshot is not MISSING:
+            return snapshot
+        async with self.get_session() as session:
+            row = (await session.execute(select(*UserSummary.columns).filter_by(**filters).limit(1))).first()
+        snapshot = UserSummary(*row) if row else None
+        self.user_cache.put(key, snapshot)
+        return snapshot
+
+    async def get_user_by_telegram_id(self, telegram_id):
+        """Get user by Telegram ID, as a cached UserSummary snapshot"""
+        return await self._get_user_snapshot(('telegram_id', telegram_id), telegram_id=telegram_id)
+
+    async def get_user_by_username(self, username_slug):
+        """Get user by username slug, as a cached UserSummary snapshot"""
+        return await self._get_user_snapshot(('username', username_slug), username_slug=username_slug)
+
+    async def get_verified_users(self):
+        """Get all verified users"""
+        async with self.get_session() as session:
+            result = await session.execute(select(User).filter_by(is_verified=True))
+            return result.scalars().all()
+
+    async def get_unverified_users(self):
+        """Get all unverified users"""
+        async with self.get_session() as session:
+            result = await session.execute(select(User).filter_by(is_verified=False))
+            return result.scalars().all()
+
+    async def iter_users(self, verified=None, batch_size=USER_BATCH_SIZE):
+        """Async version of DatabaseManager.iter_users, yields UserSummary objects"""
+        after_id = 0
+        while True:
+            async with self.get_session() as session:
+                rows = (await session.execute(user_batch_query(verified, after_id, batch_size))).all()
+            for row in rows:
+                yield UserSummary(*row)
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].id
+
+    def iter_verified_users(self, batch_size=USER_BATCH_SIZE):
+        """Iterate over verified users, see iter_users"""
+        return self.iter_users(True, batch_size)
+
+    def iter_unverified_users(self, batch_size=USER_BATCH_SIZE):
+        """Iterate over unverified users, see iter_users"""
+        return self.iter_users(False, batch_size)
+
+    async def count_users(self, verified=None):
+        """Count users, optionally only verified or unverified ones"""
+        async with self.get_session() as session:
+            return (await session.execute(user_count_query(verified))).scalar_one()
+
+    async def count_verified_users(self):
+        """Count verified users"""
+        return await self.count_users(True)
+
+    async def count_unverified_users(self):
+        """Count unverified users"""
+        return await self.count_users(False)
+
+
+_async_db = None
+
+
+def get_async_db():
+    """Process-wide AsyncDatabaseManager, so every caller shares one engine and pool"""
+    global _async_db
+    if _async_db is None:
+        _async_db = AsyncDatabaseManager()
+    return _async_db
+
+
+async def get_db_session():
+    """
+    FastAPI dependency with a session on the shared engine
+
+    Usage: `async def route(session: AsyncSession = Depends(get_db_session))`
+    """
+    async for session in get_async_db().session_dependency():
+        yield session
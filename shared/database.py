@@ -1,19 +1,222 @@
-from sqlalchemy import create_engine
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import create_engine, event, func, insert, or_, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
-from shared.models import Base, User
+from shared.models import Base, User, UserSummary
+from shared.passwords import hash_passwords
+from shared.usercache import MISSING, UserCache
 import secrets
 import string
-from config import DATABASE_NAME
+from config import settings
+
+
+def sqlite_pragmas(in_memory=False):
+    """PRAGMAs applied to every new SQLite connection"""
+    db = settings.db
+    pragmas = {
+        'busy_timeout': db.sqlite_busy_timeout,
+        'cache_size': db.sqlite_cache_size,
+        'foreign_keys': 'ON',
+    }
+    if not in_memory:
+        # WAL lets the web app read while a bot writes
+        pragmas['journal_mode'] = 'WAL'
+        pragmas['synchronous'] = 'NORMAL'
+        pragmas['mmap_size'] = db.sqlite_mmap_size
+    return pragmas
+
+
+def engine_options(database_url):
+    """
+    Engine keyword arguments for a database URL
+
+    Args:
+        database_url (str): SQLAlchemy database URL
+
+    Returns:
+        dict: Keyword arguments for create_engine
+    """
+    db = settings.db
+    url = make_url(database_url)
+    options = {
+        'pool_pre_ping': True,
+        'pool_recycle': db.pool_recycle,
+    }
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': db.sqlite_busy_timeout / 1000,
+        }
+        if url.database and url.database != ':memory:':
+            options.update(pool_size=db.pool_size, max_overflow=db.max_overflow, pool_timeout=db.pool_timeout)
+    else:
+        options.update(pool_size=db.pool_size, max_overflow=db.max_overflow, pool_timeout=db.pool_timeout)
+    return options
+
+
+def set_sqlite_pragmas(engine):
+    """Apply sqlite_pragmas on every connection the engine opens"""
+    in_memory = engine.url.database in (None, '', ':memory:')
+    pragmas = sqlite_pragmas(in_memory)
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+
+def create_db_engine(database_url=None):
+    """Create an engine with pool settings and, for SQLite, tuned PRAGMAs"""
+    if database_url is None:
+        database_url = settings.db.url
+    engine = create_engine(database_url, **engine_options(database_url))
+    if engine.url.get_backend_name() == 'sqlite':
+        set_sqlite_pragmas(engine)
+    return engine
+
+
+# Verification attempts when a concurrent verification takes the same slug
+SLUG_RETRIES = 5
+
+
+def slug_candidates_filter(base_slug, dialect_name=None):
+    """
+    Match the slugs that collide with base_slug: itself and base_slug_<anything>
+
+    The suffixed slugs are matched with LIKE on an escaped prefix, a plain
+    range comparison would depend on the database collation. SQLite can't
+    search the unique index with that LIKE, so there it is narrowed by a
+    range in BINARY (bytewise) order, which is the index order. PostgreSQL
+    searches ix_users_username_slug_pattern for the LIKE prefix. The match
+    may be case-insensitive, next_free_slug ignores the extra rows.
+    """
+    escaped = base_slug.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    suffixed = User.username_slug.like(escaped + '\\_%', escape='\\')
+    if dialect_name == 'sqlite':
+        slug = User.username_slug.collate('BINARY')
+        # '`' follows '_', so this is every slug starting with base_slug_
+        suffixed = (slug >= f"{base_slug}_") & (slug < f"{base_slug}`") & suffixed
+    return or_(User.username_slug == base_slug, suffixed)
+
+
+def slug_candidates_query(base_slug, exclude_user_id=None, dialect_name=None):
+    """Select the slugs that collide with base_slug"""
+    query = select(User.username_slug).where(slug_candidates_filter(base_slug, dialect_name))
+    if exclude_user_id is not None:
+        query = query.where(User.id != exclude_user_id)
+    return query
+
+
+def next_free_slug(base_slug, taken):
+    """Pick base_slug, or base_slug_N with the lowest free N, given the taken slugs"""
+    taken = set(taken)
+    if base_slug not in taken:
+        return base_slug
+    prefix = f"{base_slug}_"
+    suffixes = {int(slug[len(prefix):]) for slug in taken
+                if slug.startswith(prefix) and slug[len(prefix):].isdigit()}
+    counter = 1
+    while counter in suffixes:
+        counter += 1
+    return f"{base_slug}_{counter}"
+
+
+def allocate_slugs(base_slugs, taken):
+    """
+    Allocate free slugs for many users at once
+
+    Args:
+        base_slugs (list): Base slug of each user
+        taken (iterable): Slugs already in use that collide with any base slug
+
+    Returns:
+        list: A distinct free slug for each user, in order
+    """
+    taken = set(taken)
+    slugs = []
+    for base_slug in base_slugs:
+        slug = next_free_slug(base_slug, taken)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def batches(iterable, size):
+    """Split an iterable into lists of at most `size` items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def base_slug_for(user):
+    """Slug to start from, users without a Telegram username get user_<telegram id>"""
+    return user.generate_username_slug() or f"user_{user.telegram_id}"
+
+
+# Rows fetched per query by the user iterators
+USER_BATCH_SIZE = 500
+
+
+def create_missing_indexes(connection):
+    """Create indexes added to the models after their tables were created"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+def user_batch_query(verified=None, after_id=0, limit=USER_BATCH_SIZE):
+    """
+    Select the next batch of users after `after_id`, ordered by id
+
+    Args:
+        verified (bool): Only verified or unverified users, all users if None
+        after_id (int): Last id of the previous batch
+        limit (int): Batch size
+
+    Returns:
+        Select: Query for UserSummary.columns rows
+    """
+    query = select(*UserSummary.columns).where(User.id > after_id)
+    if verified is not None:
+        query = query.where(User.is_verified == verified)
+    return query.order_by(User.id).limit(limit)
+
+
+def user_count_query(verified=None):
+    """Count users, optionally only verified or unverified ones"""
+    query = select(func.count(User.id))
+    if verified is not None:
+        query = query.where(User.is_verified == verified)
+    return query
+
+
+def generate_temp_password(length=12):
+    """Generate a temporary password"""
+    characters = string.ascii_letters + string.digits
+    return ''.join(secrets.choice(characters) for _ in range(length))
 
 
 class DatabaseManager:
-    def __init__(self, database_url=f"sqlite:///{DATABASE_NAME}"):
-        self.engine = create_engine(database_url)
+    def __init__(self, database_url=None):
+        self.engine = create_db_engine(database_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.user_cache = UserCache(settings.db.user_cache_size, settings.db.user_cache_ttl)
 
     def init_db(self):
         """Initialize database tables"""
         Base.metadata.create_all(bind=self.engine)
+        with self.engine.begin() as connection:
+            create_missing_indexes(connection)
 
     def get_session(self):
         """Get database session"""
@@ -39,6 +242,7 @@ class DatabaseManager:
             session.add(user)
             session.commit()
             session.refresh(user)
+            self.user_cache.invalidate(telegram_id=telegram_id)
             return user
         except Exception as e:
             session.rollback()
@@ -46,47 +250,170 @@ class DatabaseManager:
         finally:
             session.close()
 
-    def verify_user(self, telegram_id):
-        """Verify a user and generate login credentials"""
-        session = self.get_session()
-        try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                return None
+    def bulk_create_users(self, users, batch_size=USER_BATCH_SIZE):
+        """
+        Create many unverified users, one transaction per batch
 
-            # Generate username slug
-            username_slug = user.generate_username_slug()
+        Args:
+            users (iterable): (telegram_id, telegram_username) or
+                (telegram_id, telegram_username, email) tuples
+            batch_size (int): Users inserted per transaction
 
-            # Check for uniqueness and handle duplicates
-            base_slug = username_slug
-            counter = 1
-            while session.query(User).filter_by(username_slug=username_slug).first():
-                username_slug = f"{base_slug}_{counter}"
-                counter += 1
+        Yields:
+            UserSummary: Each user in input order, existing users included
+        """
+        for batch in batches(users, batch_size):
+            rows = {}
+            for telegram_id, telegram_username, *rest in batch:
+                rows.setdefault(telegram_id, {
+                    'telegram_id': telegram_id,
+                    'telegram_username': telegram_username,
+                    'email': rest[0] if rest else None,
+                    'is_verified': False,
+                })
+            session = self.get_session()
+            try:
+                existing = set(session.execute(
+                    select(User.telegram_id).where(User.telegram_id.in_(rows))
+                ).scalars())
+                new_rows = [row for telegram_id, row in rows.items() if telegram_id not in existing]
+                if new_rows:
+                    session.execute(insert(User), new_rows)
+                summaries = {
+                    row.telegram_id: UserSummary(*row)
+                    for row in session.execute(select(*UserSummary.columns).where(User.telegram_id.in_(rows)))
+                }
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
+            for row in new_rows:
+                self.user_cache.invalidate(telegram_id=row['telegram_id'])
+            for telegram_id in rows:
+                yield summaries[telegram_id]
 
-            # Generate temporary password
-            temp_password = self.generate_temp_password()
+    def bulk_verify_users(self, telegram_ids, batch_size=USER_BATCH_SIZE):
+        """
+        Verify many users, one transaction per batch
 
-            user.username_slug = username_slug
-            user.set_password(temp_password)
-            user.verify_user()
+        Slugs for a batch are allocated from one query, users that already
+        have a slug keep it. Temporary passwords are hashed in parallel.
+        Unknown Telegram IDs are skipped.
 
-            session.commit()
-            return {
-                'user': user,
-                'temp_password': temp_password,
-                'username': username_slug
-            }
-        except Exception as e:
-            session.rollback()
-            raise e
-        finally:
-            session.close()
+        Args:
+            telegram_ids (iterable): Telegram IDs of the users to verify
+            batch_size (int): Users verified per transaction
+
+        Yields:
+            dict: Same as verify_user, with a UserSummary as 'user'
+        """
+        for batch in batches(telegram_ids, batch_size):
+            batch = list(dict.fromkeys(batch))
+            temp_passwords = [self.generate_temp_password() for _ in batch]
+            password_hashes = hash_passwords(temp_passwords)
+            for attempt in range(SLUG_RETRIES):
+                session = self.get_session()
+                try:
+                    users = {user.telegram_id: user for user in session.execute(
+                        select(User).where(User.telegram_id.in_(batch))
+                    ).scalars()}
+                    new_slugs = {}
+                    pending = [users[telegram_id] for telegram_id in batch
+                               if telegram_id in users and not users[telegram_id].username_slug]
+                    if pending:
+                        base_slugs = [base_slug_for(user) for user in pending]
+                        taken = session.execute(
+                            select(User.username_slug).where(or_(*(
+                                slug_candidates_filter(base_slug, self.engine.dialect.name)
+                                for base_slug in set(base_slugs)
+                            )))
+                        ).scalars()
+                        new_slugs = dict(zip((user.id for user in pending), allocate_slugs(base_slugs, taken)))
+
+                    now = datetime.now()
+                    results = []
+                    rows = []
+                    for telegram_id, temp_password, password_hash in zip(batch, temp_passwords, password_hashes):
+                        user = users.get(telegram_id)
+                        if user is None:
+                            continue
+                        slug = new_slugs.get(user.id, user.username_slug)
+                        rows.append({
+                            'id': user.id,
+                            'username_slug': slug,
+                            'password_hash': password_hash,
+                            'is_verified': True,
+                            'verified_at': now,
+                            'updated_at': now,
+                        })
+                        results.append({
+                            'user': UserSummary(user.id, telegram_id, user.telegram_username, slug, True, now),
+                            'temp_password': temp_password,
+                            'username': slug
+                        })
+                    if rows:
+                        session.execute(update(User), rows)
+                    session.commit()
+                    break
+                except IntegrityError:
+                    session.rollback()
+                    if attempt == SLUG_RETRIES - 1:
+                        raise
+                except Exception as e:
+                    session.rollback()
+                    raise e
+                finally:
+                    session.close()
+            for result in results:
+                self.user_cache.invalidate(telegram_id=result['user'].telegram_id, username_slug=result['username'])
+            yield from results
+
+    def allocate_username_slug(self, session, user):
+        """Find a free username slug for a user with one query"""
+        base_slug = base_slug_for(user)
+        taken = session.execute(slug_candidates_query(base_slug, user.id, self.engine.dialect.name)).scalars()
+        return next_free_slug(base_slug, taken)
+
+    def verify_user(self, telegram_id):
+        """Verify a user and generate login credentials"""
+        # Generate temporary password
+        temp_password = self.generate_temp_password()
+        for attempt in range(SLUG_RETRIES):
+            session = self.get_session()
+            try:
+                user = session.query(User).filter_by(telegram_id=telegram_id).first()
+                if not user:
+                    return None
+
+                # The unique constraint decides if another verification took the slug first
+                username_slug = self.allocate_username_slug(session, user)
+
+                user.username_slug = username_slug
+                user.set_password(temp_password)
+                user.verify_user()
+
+                session.commit()
+                self.user_cache.invalidate(telegram_id=telegram_id, username_slug=username_slug)
+                return {
+                    'user': user,
+                    'temp_password': temp_password,
+                    'username': username_slug
+                }
+            except IntegrityError:
+                session.rollback()
+                if attempt == SLUG_RETRIES - 1:
+                    raise
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
 
     def generate_temp_password(self, length=12):
         """Generate a temporary password"""
-        characters = string.ascii_letters + string.digits
-        return ''.join(secrets.choice(characters) for _ in range(length))
+        return generate_temp_password(length)
 
     def change_password(self, username_slug, new_password):
         """Change user password"""
@@ -96,6 +423,7 @@ class DatabaseManager:
             if user:
                 user.set_password(new_password)
                 session.commit()
+                self.user_cache.invalidate(username_slug=username_slug)
                 return True
             return False
         except Exception as e:
@@ -104,21 +432,59 @@ class DatabaseManager:
         finally:
             session.close()
 
-    def get_user_by_telegram_id(self, telegram_id):
-        """Get user by Telegram ID"""
+    def authenticate(self, username_slug, password):
+        """
+        Check a user's password, upgrading the hash if it uses outdated parameters
+
+        Returns:
+            User: The user if the password is correct, else None
+        """
         session = self.get_session()
         try:
-            return session.query(User).filter_by(telegram_id=telegram_id).first()
+            user = session.query(User).filter_by(username_slug=username_slug).first()
+            if not user or not user.check_password(password):
+                return None
+            if user.password_needs_rehash():
+                user.set_password(password)
+                session.commit()
+                session.refresh(user)
+            return user
+        except Exception as e:
+            session.rollback()
+            raise e
         finally:
             session.close()
 
-    def get_user_by_username(self, username_slug):
-        """Get user by username slug"""
+    def _get_user_snapshot(self, key, **filters):
+        snapshot = self.user_cache.get(key)
+        if snapshot is not MISSING:
+            return snapshot
         session = self.get_session()
         try:
-            return session.query(User).filter_by(username_slug=username_slug).first()
+            row = session.execute(select(*UserSummary.columns).filter_by(**filters).limit(1)).first()
         finally:
             session.close()
+        snapshot = UserSummary(*row) if row else None
+        self.user_cache.put(key, snapshot)
+        return snapshot
+
+    def get_user_by_telegram_id(self, telegram_id):
+        """
+        Get user by Telegram ID
+
+        Returns:
+            UserSummary: Cached read-only snapshot of the user, or None
+        """
+        return self._get_user_snapshot(('telegram_id', telegram_id), telegram_id=telegram_id)
+
+    def get_user_by_username(self, username_slug):
+        """
+        Get user by username slug
+
+        Returns:
+            UserSummary: Cached read-only snapshot of the user, or None
+        """
+        return self._get_user_snapshot(('username', username_slug), username_slug=username_slug)
 
     def get_verified_users(self):
         """Get all verified users"""
@@ -135,3 +501,55 @@ class DatabaseManager:
             return session.query(User).filter_by(is_verified=False).all()
         finally:
             session.close()
+
+    def iter_users(self, verified=None, batch_size=USER_BATCH_SIZE):
+        """
+        Iterate over users in id order without loading them all at once
+
+        Each batch is fetched with its own short session by keyset
+        pagination on (is_verified, id), so the iterator can be consumed
+        slowly without holding a connection.
+
+        Args:
+            verified (bool): Only verified or unverified users, all users if None
+            batch_size (int): Rows fetched per query
+
+        Yields:
+            UserSummary: One user
+        """
+        after_id = 0
+        while True:
+            session = self.get_session()
+            try:
+                rows = session.execute(user_batch_query(verified, after_id, batch_size)).all()
+            finally:
+                session.close()
+            for row in rows:
+                yield UserSummary(*row)
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].id
+
+    def iter_verified_users(self, batch_size=USER_BATCH_SIZE):
+        """Iterate over verified users, see iter_users"""
+        return self.iter_users(True, batch_size)
+
+    def iter_unverified_users(self, batch_size=USER_BATCH_SIZE):
+        """Iterate over unverified users, see iter_users"""
+        return self.iter_users(False, batch_size)
+
+    def count_users(self, verified=None):
+        """Count users, optionally only verified or unverified ones"""
+        session = self.get_session()
+        try:
+            return session.execute(user_count_query(verified)).scalar_one()
+        finally:
+            session.close()
+
+    def count_verified_users(self):
+        """Count verified users"""
+        return self.count_users(True)
+
+    def count_unverified_users(self):
+        """Count unverified users"""
+        return self.count_users(False)
@@ -1,17 +1,24 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from sqlalchemy.sql import func
 import re
-from werkzeug.security import generate_password_hash, check_password_hash
+from shared.passwords import hash_password, verify_password, needs_rehash
 
 Base = declarative_base()
 
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset pagination over verified/unverified users
+        Index('ix_users_is_verified_id', 'is_verified', 'id'),
+        # Slug prefix LIKE on PostgreSQL, SQLite searches the unique index with a range
+        Index('ix_users_username_slug_pattern', 'username_slug',
+              postgresql_ops={'username_slug': 'varchar_pattern_ops'}).ddl_if(dialect='postgresql'),
+    )
     
     id = Column(Integer, primary_key=True)
     telegram_id = Column(Integer, unique=True, nullable=False)
@@ -31,11 +38,15 @@ class User(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if the provided password matches the hash"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Check if the hash was made with outdated hashing parameters"""
+        return needs_rehash(self.password_hash)
     
     def generate_username_slug(self):
         """Generate a slugified username from Telegram username"""
@@ -55,4 +66,34 @@ class User(Base):
         self.verified_at = datetime.now()
     
     def __repr__(self):
-        return f'<User {self.telegram_username} ({self.telegram_id})>'
\ No newline at end of file
+        return f'<User {self.telegram_username} ({self.telegram_id})>'
+
+
+class UserSummary:
+    """Lightweight read-only view of a user row, used by the user iterators and the user cache"""
+    __slots__ = ('id', 'telegram_id', 'telegram_username', 'username_slug', 'is_verified', 'verified_at')
+
+    # Columns selected for a UserSummary, in constructor order
+    columns = (User.id, User.telegram_id, User.telegram_username, User.username_slug,
+               User.is_verified, User.verified_at)
+
+    def __init__(self, id, telegram_id, telegram_username, username_slug, is_verified, verified_at):
+        set_field = object.__setattr__
+        set_field(self, 'id', id)
+        set_field(self, 'telegram_id', telegram_id)
+        set_field(self, 'telegram_username', telegram_username)
+        set_field(self, 'username_slug', username_slug)
+        set_field(self, 'is_verified', is_verified)
+        set_field(self, 'verified_at', verified_at)
+
+    @classmethod
+    def from_user(cls, user):
+        """Snapshot of a User object"""
+        return cls(user.id, user.telegram_id, user.telegram_username, user.username_slug,
+                   user.is_verified, user.verified_at)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self):
+        return f'<UserSummary {self.telegram_username} ({self.telegram_id})>'
@@ -0,0 +1,298 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Compact once the log holds this many records more than twice the live entries
+COMPACT_SLACK = 64
+
+
+class NewsStore:
+    """
+    News entries stored as an append-only JSON lines log
+
+    Every change is a single appended record, so adding, updating or
+    deleting a news item by id costs O(1) on disk. Ids come from a counter
+    that never goes back, deletes only append a tombstone, so ids stay
+    stable. `compact` rewrites the log with only the live entries and the
+    counter, atomically through a temporary file.
+    Entries are also kept in a (timestamp, id) index for keyset pagination.
+    `version` grows by one with every add and delete, so readers can use
+    it as a cache key for anything rendered from the news list.
+    Readers call `refresh` to apply records appended by another process.
+
+    Record formats:
+        {"op": "add", "news": {...}, "at": 1700000000.0}
+        {"op": "set", "id": 1, "fields": {...}}
+        {"op": "del", "id": 1, "at": 1700000000.0}
+        {"op": "meta", "next_id": 5, "version": 12, "updated_at": 1700000000.0}
+
+    A compacted log ends with a meta record, which restores the counters
+    that the live entries alone can't.
+    """
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._order = []
+        self._next_id = 1
+        self.version = 0
+        self.updated_at = None
+        self._offset = 0
+        self._inode = None
+        self._records = 0
+        self._legacy = False
+        self.load()
+
+    # Reading
+
+    def load(self):
+        """Replay the whole log"""
+        with self._lock:
+            self._entries = {}
+            self._order = []
+            self._next_id = 1
+            self.version = 0
+            self.updated_at = None
+            self._offset = 0
+            self._inode = None
+            self._records = 0
+            self._legacy = False
+            if not os.path.exists(self.path):
+                self._load_legacy()
+                return
+            self._read_from(0)
+
+    def refresh(self):
+        """
+        Apply records written since the last read
+
+        Returns:
+            bool: True if anything changed
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # The log was compacted or replaced
+                self.load()
+                return True
+            if st.st_size == self._offset:
+                return False
+            return self._read_from(self._offset)
+
+    def _read_from(self, offset):
+        changed = False
+        with open(self.path, 'rb') as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Partially written record, read it on the next refresh
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(record)
+                changed = True
+        self._offset = offset
+        return changed
+
+    def _load_legacy(self):
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        with open(self.legacy_path, 'r', encoding='utf-8') as f:
+            for news in json.load(f):
+                self._insert(news)
+        self._legacy = True
+
+    @staticmethod
+    def _sort_key(news):
+        return news.get('timestamp', ''), news['id']
+
+    def _unindex(self, key):
+        index = bisect.bisect_left(self._order, key)
+        if index < len(self._order) and self._order[index] == key:
+            del self._order[index]
+
+    def _insert(self, news):
+        self._remove(news['id'])
+        self._entries[news['id']] = news
+        bisect.insort(self._order, self._sort_key(news))
+        self._next_id = max(self._next_id, news['id'] + 1)
+
+    def _remove(self, news_id):
+        news = self._entries.pop(news_id, None)
+        if news is not None:
+            self._unindex(self._sort_key(news))
+        return news
+
+    def _apply(self, record):
+        op = record.get('op')
+        if op == 'add':
+            self._insert(record['news'])
+            self._touch(record.get('at'))
+        elif op == 'meta':
+            self._next_id = max(self._next_id, record['next_id'])
+            self.version = record.get('version', self.version)
+            self.updated_at = record.get('updated_at', self.updated_at)
+        elif op == 'set':
+            news = self._entries.get(record['id'])
+            if news is not None:
+                old_key = self._sort_key(news)
+                news.update(record['fields'])
+                if self._sort_key(news) != old_key:
+                    self._unindex(old_key)
+                    bisect.insort(self._order, self._sort_key(news))
+        elif op == 'del':
+            self._remove(record['id'])
+            self._touch(record.get('at'))
+        self._records += 1
+
+    def _touch(self, at):
+        self.version += 1
+        if at is not None:
+            self.updated_at = at
+
+    def get(self, news_id):
+        """Get news entry by id"""
+        return self._entries.get(news_id)
+
+    def list(self):
+        """Get all news entries in the order they were added"""
+        return list(self._entries.values())
+
+    @staticmethod
+    def make_cursor(news):
+        """Encode the position of a news entry as a pagination cursor"""
+        return f"{news.get('timestamp', '')}_{news['id']}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """Decode a pagination cursor, raises ValueError if it is malformed"""
+        timestamp, sep, news_id = cursor.rpartition('_')
+        if not sep:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return timestamp, int(news_id)
+
+    def page(self, cursor=None, limit=10):
+        """
+        Get a page of news, newest first
+
+        Args:
+            cursor (str): Cursor returned with the previous page, None for the first page
+            limit (int): Page size
+
+        Returns:
+            tuple: List of entries and the cursor of the next page (None on the last page)
+        """
+        if cursor is None:
+            end = len(self._order)
+        else:
+            end = bisect.bisect_left(self._order, self.parse_cursor(cursor))
+        start = max(0, end - limit)
+        news_list = [self._entries[news_id] for _, news_id in reversed(self._order[start:end])]
+        next_cursor = self.make_cursor(news_list[-1]) if start > 0 and news_list else None
+        return news_list, next_cursor
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Writing
+
+    def _append(self, record):
+        if self._legacy or not os.path.exists(self.path):
+            # First write after migrating from the old JSON file
+            self.compact()
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.path, 'ab') as f:
+            if f.tell() != self._offset:
+                # Drop a record torn by a crash mid-write
+                f.truncate(self._offset)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            self._inode = os.fstat(f.fileno()).st_ino
+        self._offset += len(line)
+        self._apply(record)
+        if self._records > 2 * len(self._entries) + COMPACT_SLACK:
+            self.compact()
+
+    def add(self, news):
+        """
+        Append a news entry
+
+        Args:
+            news (dict): Entry without an id
+
+        Returns:
+            dict: The stored entry with its id
+        """
+        with self._lock:
+            self.refresh()
+            news = dict(news, id=self._next_id)
+            self._append({'op': 'add', 'news': news, 'at': time.time()})
+            return news
+
+    def update(self, news_id, **fields):
+        """Update fields of a news entry, returns False if it does not exist"""
+        with self._lock:
+            self.refresh()
+            if news_id not in self._entries:
+                return False
+            self._append({'op': 'set', 'id': news_id, 'fields': fields})
+            return True
+
+    def delete(self, news_id):
+        """Delete a news entry by appending a tombstone, returns the removed entry or None"""
+        with self._lock:
+            self.refresh()
+            news = self._entries.get(news_id)
+            if news is None:
+                return None
+            self._append({'op': 'del', 'id': news_id, 'at': time.time()})
+            return news
+
+    def compact(self):
+        """Atomically rewrite the log with the live entries and the counters"""
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.news-', suffix='.tmp')
+            try:
+                os.chmod(tmp_path, 0o644)
+                with os.fdopen(fd, 'wb') as f:
+                    for news in self._entries.values():
+                        record = {'op': 'add', 'news': news}
+                        f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                    meta = {
+                        'op': 'meta',
+                        'next_id': self._next_id,
+                        'version': self.version,
+                        'updated_at': self.updated_at
+                    }
+                    f.write((json.dumps(meta) + '\n').encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+                    inode = os.fstat(f.fileno()).st_ino
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            self._offset = size
+            self._inode = inode
+            self._records = len(self._entries) + 1
+            self._legacy = False
@@ -0,0 +1,150 @@
+"""
+Password hashing
+
+Hashes use the method set by `settings.auth` in config.py: scrypt or
+pbkdf2 through werkzeug, or argon2 when argon2-cffi is installed. Existing
+hashes of any of these methods keep verifying, and `needs_rehash` tells
+when a hash was made with other parameters than the configured ones.
+
+At most `password_hash_workers` hashes are computed at once. Async code uses
+the `*_async` functions, which run on a pool of that size so the event
+loop is never blocked.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import settings
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+ARGON2_PREFIX = '$argon2'
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords with one configured method
+
+    Args:
+        method (str): 'scrypt', 'pbkdf2' or 'argon2'
+        workers (int): Hashes computed at the same time
+        scrypt_n, scrypt_r, scrypt_p (int): scrypt cost parameters
+        pbkdf2_iterations (int): PBKDF2-SHA256 iterations
+        argon2_time_cost, argon2_memory_cost, argon2_parallelism (int): argon2id parameters
+    """
+
+    def __init__(self, method='scrypt', workers=2, scrypt_n=2 ** 15, scrypt_r=8, scrypt_p=1,
+                 pbkdf2_iterations=600000, argon2_time_cost=3, argon2_memory_cost=65536, argon2_parallelism=4):
+        if method == 'argon2' and argon2 is None:
+            logging.warning("argon2-cffi is not installed, hashing passwords with scrypt")
+            method = 'scrypt'
+        if method == 'scrypt':
+            self.method = f'scrypt:{scrypt_n}:{scrypt_r}:{scrypt_p}'
+        elif method == 'pbkdf2':
+            self.method = f'pbkdf2:sha256:{pbkdf2_iterations}'
+        elif method == 'argon2':
+            self.method = 'argon2'
+        else:
+            raise ValueError(f"Unknown password hash method: {method}")
+
+        self._argon2 = None
+        if argon2 is not None:
+            self._argon2 = argon2.PasswordHasher(
+                time_cost=argon2_time_cost, memory_cost=argon2_memory_cost, parallelism=argon2_parallelism
+            )
+        self._slots = threading.BoundedSemaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        with self._slots:
+            if self.method == 'argon2':
+                return self._argon2.hash(password)
+            return generate_password_hash(password, method=self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a hash made with any supported method"""
+        if not password_hash:
+            return False
+        with self._slots:
+            if password_hash.startswith(ARGON2_PREFIX):
+                if self._argon2 is None:
+                    return False
+                try:
+                    return self._argon2.verify(password_hash, password)
+                except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+                    return False
+            return check_password_hash(password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Check whether a hash was made with another method or other parameters"""
+        if not password_hash:
+            return False
+        if password_hash.startswith(ARGON2_PREFIX):
+            return self.method != 'argon2' or self._argon2.check_needs_rehash(password_hash)
+        return password_hash.split('$', 1)[0] != self.method
+
+    async def run(self, func, *args):
+        """Run a hashing call on the pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def hash_many(self, passwords):
+        """Hash many passwords in parallel on the pool, in order"""
+        return list(self._executor.map(self.hash, passwords))
+
+
+_password_hasher = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """Process-wide PasswordHasher, created from settings.auth on first use"""
+    global _password_hasher
+    if _password_hasher is None:
+        with _hasher_lock:
+            if _password_hasher is None:
+                auth = settings.auth
+                _password_hasher = PasswordHasher(
+                    method=auth.password_hash_method,
+                    workers=auth.password_hash_workers,
+                    scrypt_n=auth.scrypt_n,
+                    scrypt_r=auth.scrypt_r,
+                    scrypt_p=auth.scrypt_p,
+                    pbkdf2_iterations=auth.pbkdf2_iterations,
+                    argon2_time_cost=auth.argon2_time_cost,
+                    argon2_memory_cost=auth.argon2_memory_cost,
+                    argon2_parallelism=auth.argon2_parallelism,
+                )
+    return _password_hasher
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def verify_password(password_hash, password):
+    return get_password_hasher().verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return get_password_hasher().needs_rehash(password_hash)
+
+
+def hash_passwords(passwords):
+    return get_password_hasher().hash_many(passwords)
+
+
+async def hash_password_async(password):
+    hasher = get_password_hasher()
+    return await hasher.run(hasher.hash, password)
+
+
+async def verify_password_async(password_hash, password):
+    hasher = get_password_hasher()
+    return await hasher.run(hasher.verify, password_hash, password)
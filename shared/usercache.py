@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by UserCache.get when a key isn't cached, None means "no such user"
+MISSING = object()
+
+
+class UserCache:
+    """
+    Bounded LRU cache of user snapshots with a time to live
+
+    Snapshots are cached under both the Telegram ID and the username slug,
+    lookups of unknown users are cached as None. Writes in this process
+    invalidate their keys; changes made by other processes show up once
+    the entries expire after `ttl` seconds.
+
+    Args:
+        max_entries (int): Cached keys kept before the least recently used are dropped
+        ttl (float): Seconds an entry stays valid
+    """
+
+    def __init__(self, max_entries=4096, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a key
+
+        Args:
+            key (tuple): ('telegram_id', id) or ('username', slug)
+
+        Returns:
+            UserSummary, None for a cached missing user, or MISSING
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, snapshot):
+        """Cache a lookup result under its key and the other key of the user"""
+        expires_at = time.monotonic() + self.ttl
+        keys = [key]
+        if snapshot is not None:
+            keys = [('telegram_id', snapshot.telegram_id)]
+            if snapshot.username_slug:
+                keys.append(('username', snapshot.username_slug))
+        with self._lock:
+            for cache_key in keys:
+                self._entries[cache_key] = (snapshot, expires_at)
+                self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id=None, username_slug=None):
+        """Drop the entries of a user, by either key"""
+        keys = []
+        if telegram_id is not None:
+            keys.append(('telegram_id', telegram_id))
+        if username_slug is not None:
+            keys.append(('username', username_slug))
+        with self._lock:
+            while keys:
+                entry = self._entries.pop(keys.pop(), None)
+                snapshot = entry[0] if entry else None
+                if snapshot is not None:
+                    keys.append(('telegram_id', snapshot.telegram_id))
+                    if snapshot.username_slug:
+                        keys.append(('username', snapshot.username_slug))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and size, for dashboards"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
@@ -1,2 +1,3 @@
 source .venv/bin/activate
-uvicorn website.app:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+python3 -m website.assets
+python3 -m website.serve
\ No newline at end of file
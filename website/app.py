@@ -3,114 +3,159 @@ from fastapi.responses import HTMLResponse, PlainTextResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from website.getservice import check_multiple_services
-import json
+from config import NEWS_JSON_FILE, NEWS_LOG_FILE, settings
+from shared.newsstore import NewsStore
+from website.assets import PrecompressedStaticFiles, manifest_path, static_exists, static_url
+from website.newscache import NewsCache
+from website.pagecache import PageCache, etag_matches
+from website.ratelimit import RateLimiter, SQLiteBanStore, TrustedClients
+from website.security import SecurityMiddleware, load_blocklist
+from website.statussampler import StatusSampler
+from website.statushistory import StatusHistory, WEEK
+from contextlib import asynccontextmanager
 import os
 
+MONITORED_SERVICES = [['ngircd', 'IRC'], ['wg-quick@wg0', 'Network']]
+MONITORED_PROCESSES = [['python3 bot.py', 'Telegram Bot']]
+STATUS_REFRESH_INTERVAL = settings.web.status_refresh_interval
+NEWS_PAGE_SIZE = 20
+
+status_history = StatusHistory(capacity=WEEK // STATUS_REFRESH_INTERVAL + 1)
+status_sampler = StatusSampler(MONITORED_SERVICES, MONITORED_PROCESSES,
+                               interval=STATUS_REFRESH_INTERVAL, history=status_history,
+                               shared_path=settings.web.status_shared_file)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    status_sampler.start()
+    yield
+    await status_sampler.stop()
+
+
 app = FastAPI(
     docs_url=None,
     redoc_url=None,
-    openapi_url=None
+    openapi_url=None,
+    lifespan=lifespan
 )
 
-app.mount("/static", StaticFiles(directory="website/static", html=True), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory="website/static", html=True), name="static")
 
 templates = Jinja2Templates(directory="website/templates")
+templates.env.globals['static_url'] = static_url
+templates.env.globals['static_exists'] = static_exists
+# Pages also change when a deploy rebuilds the assets
+page_cache = PageCache(templates, dependencies=[manifest_path()])
 
 
-def load_news():
-    try:
-        with open('news.json', 'r', encoding='utf-8') as f:
-            news_list = json.load(f)
-            news_list.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-            return news_list
-    except FileNotFoundError:
-        return []
-
-
-# Middleware for security checks (similar to before_request in Flask)
-class SecurityMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Block CONNECT method
-        if request.method == 'CONNECT':
-            return templates.TemplateResponse(
-                "error.html",
-                {"request": request, "title": "error", "error": ">  405 Method not allowed"},
-                status_code=405)
+news_cache = NewsCache(NewsStore(NEWS_LOG_FILE, legacy_path=NEWS_JSON_FILE), top_n=7)
 
-        # Block suspicious paths
-        suspicious_paths = ['.git', '.env', 'wp-', 'admin', 'http://', 'https://']
-        if any(suspicious in request.url.path for suspicious in suspicious_paths):
-            return templates.TemplateResponse(
-                "error.html",
-                {"request": request, "title": "error", "error": ">  404 Not found"},
-                status_code=404)
 
-        response = await call_next(request)
+def render_error_pages():
+    """Pre-render the error pages sent by SecurityMiddleware"""
+    template = templates.get_template("error.html")
+    errors = {
+        404: ">  404 Not found",
+        405: ">  405 Method not allowed",
+        429: ">  429 Too many requests"
+    }
+    return {code: template.render(title="error", error=error).encode('utf-8') for code, error in errors.items()}
 
-        # Add security headers (like after_request in Flask)
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-
-        return response
 
+rate_limiter = RateLimiter(
+    rate=settings.web.rate_limit_rate,
+    burst=settings.web.rate_limit_burst,
+    store=SQLiteBanStore(settings.web.rate_limit_db) if settings.web.rate_limit_db else None
+)
 
-app.add_middleware(SecurityMiddleware)
+# Rate limits clients, blocks CONNECT and suspicious paths, adds security headers
+app.add_middleware(
+    SecurityMiddleware,
+    blocked_paths=load_blocklist(settings.web.blocklist_file),
+    error_pages=render_error_pages(),
+    limiter=rate_limiter,
+    trusted_clients=TrustedClients(settings.web.trusted_proxies)
+)
 
 
 # Routes
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    news_list = load_news()[:7]
-    return templates.TemplateResponse("index.html", {"request": request, "title": "main", "news_list": news_list})
+    # The news block and the page are only re-rendered when the bot adds or deletes news
+    # or their templates change
+    version = news_cache.version
+    news_block = page_cache.fragment("news.html", {"news_list": news_cache.latest()}, key=version)
+    return page_cache.response(request, "index.html", {"title": "main", "news_block": news_block},
+                               key=f"news{version}", last_modified=news_cache.updated_at,
+                               embeds=("news.html",))
+
+
+@app.get("/news", response_class=HTMLResponse)
+async def news_archive(request: Request, cursor: str = None):
+    try:
+        news_list, next_cursor = news_cache.page(cursor, NEWS_PAGE_SIZE)
+    except ValueError:
+        raise HTTPException(status_code=404)
+    return templates.TemplateResponse("news_archive.html", {
+        "request": request,
+        "title": "news",
+        "news_list": news_list,
+        "next_cursor": next_cursor
+    })
 
 
 @app.get("/status", response_class=HTMLResponse)
 async def status(request: Request):
-    services_status = check_multiple_services(
-        [['ngircd', 'IRC'], ['wg-quick@wg0', 'Network']],
-        [['python3 bot.py', 'Telegram Bot']]
-    )
-    active_count = sum(1 for service in services_status if service['state'] == 'Active')
+    snapshot = status_sampler.snapshot
     return templates.TemplateResponse("status.html", {
         "request": request,
         "title": "status",
-        "services": services_status,
-        "active": active_count,
-        "total": len(services_status)
+        "services": snapshot.services,
+        "active": snapshot.active,
+        "total": snapshot.total
     })
 
 
+@app.get("/status.json")
+async def status_json(request: Request):
+    body, etag = status_history.document(status_sampler.snapshot)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={STATUS_REFRESH_INTERVAL}"
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/about", response_class=HTMLResponse)
 async def about(request: Request):
-    return templates.TemplateResponse("about.html", {"request": request, "title": "About CUCnet"})
+    return page_cache.response(request, "about.html", {"title": "About CUCnet"})
 
 
 @app.get("/contacts", response_class=HTMLResponse)
 async def contacts(request: Request):
-    return templates.TemplateResponse("contacts.html", {"request": request, "title": "Contacts"})
+    return page_cache.response(request, "contacts.html", {"title": "Contacts"})
 
 
 @app.get("/guides", response_class=HTMLResponse)
 async def guides(request: Request):
-    return templates.TemplateResponse("guides.html", {"request": request, "title": "Guides"})
+    return page_cache.response(request, "guides.html", {"title": "Guides"})
 
 
 @app.get("/guides/irc", response_class=HTMLResponse)
 async def irc(request: Request):
-    return templates.TemplateResponse("guides/irc.html", {"request": request, "title": "IRC Guide"})
+    return page_cache.response(request, "guides/irc.html", {"title": "IRC Guide"})
 
 
 @app.get("/guides/connect", response_class=HTMLResponse)
 async def connect(request: Request):
-    return templates.TemplateResponse("guides/connect.html", {"request": request, "title": "Connect Guide"})
+    return page_cache.response(request, "guides/connect.html", {"title": "Connect Guide"})
 
 
 @app.get("/legal/tos")
@@ -127,7 +172,7 @@ async def tos_docx(request: Request):
 
 @app.get("/rules")
 async def rules(request: Request):
-    return templates.TemplateResponse("rules.html", {"request": request, "title": "Rules"})
+    return page_cache.response(request, "rules.html", {"title": "Rules"})
 
 
 # Error handlers
@@ -179,7 +224,7 @@ async def error_forbidden():
 
 @app.get("/dev/win95")
 async def test_win95(request: Request):
-    return templates.TemplateResponse("win95.html", {"request": request})
+    return page_cache.response(request, "win95.html", {})
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,197 @@
+"""
+Static asset pipeline
+
+`python -m website.assets` copies every file under website/static into
+website/static/dist with a content hash in its name, writes .gz (and .br
+when the brotli module is installed) siblings for files that compress,
+and records the result in dist/manifest.json. Templates resolve asset
+names through `static_url`, and PrecompressedStaticFiles serves the hashed
+copies with far-future immutable caching.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+from website.pagecache import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = 'website/static'
+DIST_NAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+STATIC_PREFIX = '/static/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# A compressed sibling is kept only if it saves at least this share of the size
+MIN_SAVING = 0.05
+
+CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+_manifest = None
+
+
+def _hashed_name(rel_path, content):
+    root, ext = posixpath.splitext(rel_path)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _rewrite_css(rel_path, content, files):
+    """Point url() references of a stylesheet at the hashed file names"""
+    css_dir = posixpath.dirname(rel_path)
+
+    def replace(match):
+        quote, url = match.groups()
+        if '://' in url or url.startswith(('data:', '/', '#')):
+            return match.group(0)
+        path, sep, suffix = url.partition('?')
+        target = posixpath.normpath(posixpath.join(css_dir, path))
+        if target not in files:
+            return match.group(0)
+        hashed = posixpath.relpath(files[target]['path'], css_dir or '.')
+        return f'url({quote}{hashed}{sep}{suffix}{quote})'
+
+    return CSS_URL_RE.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write_compressed(path, content):
+    encodings = []
+    variants = [('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+    for encoding, suffix, compress in variants:
+        compressed = compress(content)
+        if len(compressed) <= len(content) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build(static_dir=STATIC_DIR):
+    """
+    Build hashed and precompressed copies of all static files
+
+    Args:
+        static_dir (str): Static files directory
+
+    Returns:
+        dict: The written manifest
+    """
+    dist_dir = os.path.join(static_dir, DIST_NAME)
+    sources = []
+    for directory, dirnames, filenames in os.walk(static_dir):
+        if os.path.abspath(directory) == os.path.abspath(static_dir) and DIST_NAME in dirnames:
+            dirnames.remove(DIST_NAME)
+        for filename in filenames:
+            full_path = os.path.join(directory, filename)
+            sources.append(os.path.relpath(full_path, static_dir).replace(os.sep, '/'))
+    # Stylesheets go last so they can reference the hashed names of other files
+    sources.sort(key=lambda rel_path: (rel_path.endswith('.css'), rel_path))
+
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    files = {}
+    for rel_path in sources:
+        with open(os.path.join(static_dir, rel_path), 'rb') as f:
+            content = f.read()
+        if rel_path.endswith('.css'):
+            content = _rewrite_css(rel_path, content, files)
+        hashed = _hashed_name(rel_path, content)
+        out_path = os.path.join(dist_dir, hashed)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, 'wb') as f:
+            f.write(content)
+        files[rel_path] = {'path': hashed, 'encodings': _write_compressed(out_path, content)}
+
+    manifest = {'files': files}
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def manifest_path(static_dir=STATIC_DIR):
+    return os.path.join(static_dir, DIST_NAME, MANIFEST_NAME)
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    """Read the asset manifest once, an empty one is used if it wasn't built"""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(manifest_path(static_dir), 'r', encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except FileNotFoundError:
+            _manifest = {'files': {}}
+    return _manifest
+
+
+def static_url(path):
+    """URL of a static file, the hashed copy is used when it was built"""
+    path = path.lstrip('/')
+    entry = load_manifest()['files'].get(path)
+    if entry is None:
+        return STATIC_PREFIX + path
+    return f'{STATIC_PREFIX}{DIST_NAME}/{entry["path"]}'
+
+
+def static_exists(path):
+    """Check whether an optional static file, e.g. a generated one, is present"""
+    path = path.lstrip('/')
+    return path in load_manifest()['files'] or os.path.isfile(os.path.join(STATIC_DIR, path))
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves the precompressed siblings written by `build`
+
+    Hashed files under dist/ never change, so they are sent with an
+    immutable Cache-Control and the best encoding the client accepts.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._encodings = {}
+        dist_prefix = os.path.join(os.path.realpath(self.directory), DIST_NAME)
+        for entry in load_manifest(self.directory)['files'].values():
+            full_path = os.path.join(dist_prefix, *entry['path'].split('/'))
+            self._encodings[full_path] = entry['encodings']
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        encodings = self._encodings.get(os.path.realpath(full_path))
+        if encodings is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        accepted = accepted_encodings(Headers(scope=scope))
+        encoding = next((encoding for encoding in encodings if encoding in accepted), None)
+
+        if encoding is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+        else:
+            suffix = '.br' if encoding == 'br' else '.gz'
+            compressed_path = str(full_path) + suffix
+            response = super().file_response(compressed_path, os.stat(compressed_path), scope, status_code)
+            if response.status_code != 304:
+                media_type = mimetypes.guess_type(str(full_path))[0] or 'application/octet-stream'
+                if media_type.startswith('text/'):
+                    media_type += '; charset=utf-8'
+                response.headers['content-type'] = media_type
+                response.headers['content-encoding'] = encoding
+        response.headers['cache-control'] = IMMUTABLE_CACHE_CONTROL
+        response.headers['vary'] = 'Accept-Encoding'
+        return response
+
+
+if __name__ == '__main__':
+    built = build()
+    print(f"Built {len(built['files'])} static files into {os.path.join(STATIC_DIR, DIST_NAME)}")
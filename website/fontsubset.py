@@ -0,0 +1,139 @@
+"""
+Font subsetting tool
+
+`python -m website.fontsubset` collects the characters used by the
+templates and the news store, writes WOFF2 subsets of the bundled TTF
+fonts to website/static/fonts/subset and `unicode-range` @font-face rules
+for them to fonts/subset/fonts.css. The templates link that stylesheet
+when it exists, its rules take precedence over the full TTF faces, which
+stay as the fallback. The subset directory is generated per deployment
+and not tracked.
+
+Needs fontTools and brotli (pip install -r requirements-dev.txt), which
+are not runtime dependencies of the site.
+"""
+import glob
+import os
+
+from shared.newsstore import NewsStore
+
+WEBSITE_DIR = 'website'
+TEMPLATES_DIR = os.path.join(WEBSITE_DIR, 'templates')
+STATIC_DIR = os.path.join(WEBSITE_DIR, 'static')
+SUBSET_DIR = 'fonts/subset'
+SUBSET_CSS = 'fonts.css'
+
+# Family and source font, relative to website/static
+FONTS = [
+    ('TDAtext', 'fonts/TDAtext.ttf'),
+    ('Fixedsys', 'fonts/Fixedsys.ttf'),
+]
+
+# Blocks that are always shipped whole, news can contain any of their characters
+BLOCKS = [
+    ('latin', [(0x20, 0x7E), (0xA0, 0xFF)]),
+    ('cyrillic', [(0x400, 0x45F), (0x490, 0x491)]),
+]
+
+
+def collect_characters(news_path='news.jsonl', legacy_path='news.json'):
+    """Return the set of code points used by the templates and the news"""
+    characters = set()
+    for path in glob.glob(os.path.join(TEMPLATES_DIR, '**', '*.html'), recursive=True):
+        with open(path, 'r', encoding='utf-8') as f:
+            characters.update(map(ord, f.read()))
+    for news in NewsStore(news_path, legacy_path=legacy_path).list():
+        characters.update(map(ord, news.get('text', '')))
+        characters.update(map(ord, news.get('date', '')))
+    # Control characters have no glyphs
+    return {code for code in characters if code >= 0x20}
+
+
+def group_characters(characters, available):
+    """
+    Split code points into subsets
+
+    Returns:
+        list: (name, sorted code points) pairs, whole blocks for the
+        scripts in use and one subset for the remaining used characters
+    """
+    groups = []
+    covered = set()
+    for name, ranges in BLOCKS:
+        block = {code for start, end in ranges for code in range(start, end + 1)}
+        covered |= block
+        if name == 'latin' or characters & block:
+            groups.append((name, sorted(block & available)))
+    extra = sorted((characters - covered) & available)
+    if extra:
+        groups.append(('extra', extra))
+    return [(name, codes) for name, codes in groups if codes]
+
+
+def unicode_range(codes):
+    """Format sorted code points as a CSS unicode-range value"""
+    ranges = []
+    start = prev = codes[0]
+    for code in codes[1:] + [None]:
+        if code is not None and code == prev + 1:
+            prev = code
+            continue
+        ranges.append(f'U+{start:X}' if start == prev else f'U+{start:X}-{prev:X}')
+        if code is not None:
+            start = prev = code
+    return ', '.join(ranges)
+
+
+def subset_font(source, output, codes):
+    """Write a WOFF2 subset of `source` with the given code points"""
+    from fontTools import subset
+
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    font = subset.load_font(source, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codes)
+    subsetter.subset(font)
+    subset.save_font(font, output, options)
+
+
+def font_face_rules(family, subsets):
+    """Build @font-face rules for the subsets, URLs are relative to SUBSET_DIR"""
+    rules = []
+    for path, codes in subsets:
+        rules.append(
+            "@font-face {\n"
+            f"  font-family: '{family}';\n"
+            f"  src: url('{os.path.basename(path)}') format('woff2');\n"
+            "  font-display: swap;\n"
+            f"  unicode-range: {unicode_range(codes)};\n"
+            "}"
+        )
+    return '\n'.join(rules)
+
+
+def main():
+    from fontTools.ttLib import TTFont
+
+    characters = collect_characters()
+    os.makedirs(os.path.join(STATIC_DIR, SUBSET_DIR), exist_ok=True)
+    stylesheet = ["/* Generated by python -m website.fontsubset */"]
+    for family, font_path in FONTS:
+        source = os.path.join(STATIC_DIR, font_path)
+        available = set(TTFont(source).getBestCmap())
+        subsets = []
+        for name, codes in group_characters(characters, available):
+            path = f'{SUBSET_DIR}/{family}-{name}.woff2'
+            subset_font(source, os.path.join(STATIC_DIR, path), codes)
+            subsets.append((path, codes))
+            size = os.path.getsize(os.path.join(STATIC_DIR, path))
+            print(f"{family}: {name} subset, {len(codes)} glyphs, {size} bytes")
+        stylesheet.append(font_face_rules(family, subsets))
+        print(f"{family}: {os.path.getsize(source)} bytes in {font_path}")
+    with open(os.path.join(STATIC_DIR, SUBSET_DIR, SUBSET_CSS), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(stylesheet) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,206 +1,310 @@
-import datetime
 import re
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import timedelta
 
 import psutil
 
 
-def get_service_status(service_name, name):
+PROBE_TIMEOUT = 5
+PROBE_DEADLINE = 8
+
+_executor = None
+
+
+SYSTEMD_PROPERTIES = ['LoadState', 'ActiveState', 'SubState', 'ActiveEnterTimestampMonotonic']
+
+
+def format_uptime(uptime_seconds):
+    """Convert uptime in seconds to a human readable string"""
+    return str(timedelta(seconds=max(0, int(uptime_seconds))))
+
+
+def query_units(units, timeout=PROBE_TIMEOUT):
+    """
+    Read systemd properties of several units with one systemctl call
+    
+    Args:
+        units (list): Names of the systemd units
+        timeout (float): Timeout for the systemctl call in seconds
+        
+    Returns:
+        list: One dictionary of properties per unit, in the order of `units`
+    """
+    result = subprocess.run(
+        ['systemctl', 'show', *units, '--property=' + ','.join(SYSTEMD_PROPERTIES)],
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    if not result.stdout.strip():
+        return [{} for _ in units]
+    blocks = result.stdout.strip('\n').split('\n\n')
+    if len(units) > 1 and len(blocks) != len(units):
+        # One of the units could not be shown, query them one by one
+        return [query_units([unit], timeout)[0] for unit in units]
+
+    unit_properties = []
+    for block in blocks:
+        properties = {}
+        for line in block.splitlines():
+            key, sep, value = line.partition('=')
+            if sep:
+                properties[key] = value
+        unit_properties.append(properties)
+    return unit_properties
+
+
+def unit_status(service_name, name, properties, now_us=None):
+    """Build a status dictionary from the properties of a systemd unit"""
+    if now_us is None:
+        now_us = time.monotonic_ns() // 1000
+
+    active_state = properties.get('ActiveState')
+    sub_state = properties.get('SubState')
+    if properties.get('LoadState') == 'not-found':
+        state = 'Not Found'
+    elif active_state is None:
+        state = 'Unknown'
+    elif active_state == 'active' and (
+            sub_state == 'running' or (service_name.startswith('wg-quick@') and sub_state == 'exited')):
+        state = 'Active'
+    else:
+        state = 'Failed'
+
+    uptime = 'N/A'
+    if state == 'Active':
+        try:
+            # systemd and time.monotonic() both use CLOCK_MONOTONIC
+            entered_us = int(properties.get('ActiveEnterTimestampMonotonic', '0'))
+        except ValueError:
+            entered_us = 0
+        if entered_us:
+            uptime = format_uptime((now_us - entered_us) / 1_000_000)
+
+    return {
+        'name': name,
+        'state': state,
+        'uptime': uptime
+    }
+
+
+def get_services_status(service_list, timeout=PROBE_TIMEOUT):
+    """
+    Check state and uptime of several systemd services at once
+    
+    Args:
+        service_list (list): List of [service name, display name] pairs
+        timeout (float): Timeout for the systemctl call in seconds
+        
+    Returns:
+        list: List of dictionaries containing service name, state, and uptime
     """
-    Check systemctl status of a service and return its state and uptime
+    if not service_list:
+        return []
+    try:
+        unit_properties = query_units([service for service, _ in service_list], timeout)
+        now_us = time.monotonic_ns() // 1000
+        return [unit_status(service, name, properties, now_us)
+                for (service, name), properties in zip(service_list, unit_properties)]
+    except subprocess.TimeoutExpired:
+        state = 'Timeout'
+    except Exception as e:
+        state = f'Error: {str(e)}'
+    return [{'name': name, 'state': state, 'uptime': 'N/A'} for _, name in service_list]
+
+
+def get_service_status(service_name, name, timeout=PROBE_TIMEOUT):
+    """
+    Check state and uptime of a single systemd service
     
     Args:
         service_name (str): Name of the systemd service
+        timeout (float): Timeout for the systemctl call in seconds
         
     Returns:
         dict: Dictionary containing service name, state, and uptime
     """
-    try:
-        # Run systemctl status command
-        result = subprocess.run(
-            ['systemctl', 'status', service_name],
-            capture_output=True,
-            text=True,
-            timeout=5  # Timeout after 5 seconds
-        )
-
-        # Parse the output
-        output = result.stdout
-
-        # Extract active state
-        active_line = [line for line in output.split('\n') if 'Active:' in line]
-        if active_line:
-            active_text = active_line[0]
-            if 'active (running)' in active_text or (
-                    service_name == 'wg-quick@wg0' and 'active (exited)' in active_text):
-                state = 'Active'
-            else:
-                state = 'Failed'
-        else:
-            state = 'Unknown'
-
-        # Extract uptime
-        # Now get the uptime specifically
-        uptime = 'N/A'
-        if state == 'Active':
-            # Use systemctl show to get the active enter timestamp
-            show_result = subprocess.run(
-                ['systemctl', 'show', service_name, '--property=ActiveEnterTimestamp'],
-                capture_output=True,
-                text=True,
-                timeout=3
-            )
-
-            if show_result.returncode == 0:
-                timestamp_line = show_result.stdout.strip()
-                if 'ActiveEnterTimestamp=' in timestamp_line:
-                    # Extract the timestamp
-                    timestamp_str = timestamp_line.split('=', 1)[1]
+    return get_services_status([[service_name, name]], timeout)[0]
+
+
+class ProcessIndex:
+    """
+    Locates watched processes with at most one pass over the process table
+
+    Matched PIDs are remembered between refreshes, the table is only scanned
+    again for matchers whose cached process has exited.
+    A matcher can be a substring of the command line (str), an exact argv
+    (list or tuple) or a compiled regular expression.
+    """
 
+    def __init__(self):
+        self._pids = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(matcher):
+        return tuple(matcher) if isinstance(matcher, list) else matcher
+
+    @staticmethod
+    def _matches(matcher, argv, cmdline):
+        if isinstance(matcher, tuple):
+            return argv == matcher
+        if isinstance(matcher, re.Pattern):
+            return matcher.search(cmdline) is not None
+        return matcher in cmdline
+
+    @staticmethod
+    def _is_alive(pid, create_time):
+        try:
+            proc = psutil.Process(pid)
+            return proc.create_time() == create_time and proc.status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return False
+
+    def lookup(self, matchers):
+        """
+        Find the start time of the process matching each matcher
+        
+        Args:
+            matchers (list): Matchers to look up
+            
+        Returns:
+            dict: Matcher key to process create_time, or None if not running
+        """
+        with self._lock:
+            found = {}
+            missing = set()
+            for matcher in matchers:
+                key = self._key(matcher)
+                cached = self._pids.get(key)
+                if cached and self._is_alive(*cached):
+                    found[key] = cached[1]
+                else:
+                    self._pids.pop(key, None)
+                    missing.add(key)
+
+            if missing:
+                for proc in psutil.process_iter(['pid', 'cmdline', 'create_time']):
                     try:
-                        # Parse the systemd timestamp (format: "Day YYYY-MM-DD HH:MM:SS TIMEZONE")
-                        # Example: "Tue 2023-10-10 14:30:45 UTC"
-                        dt = datetime.datetime.strptime(timestamp_str, "%a %Y-%m-%d %H:%M:%S %Z")
-                        uptime_seconds = (datetime.datetime.now() - dt).total_seconds()
-
-                        # Convert to human readable format
-                        uptime = str(timedelta(seconds=int(uptime_seconds)))
-                        # Remove milliseconds if present
-                        if '.' in uptime:
-                            uptime = uptime.split('.')[0]
-
-                    except ValueError:
-                        # If parsing fails, try alternative approach
-                        uptime = get_uptime_alternative(service_name)
-            else:
-                uptime = get_uptime_alternative(service_name)
-
-        return {
-            'name': name,
-            'state': state,
-            'uptime': uptime
-        }
+                        argv = tuple(proc.info['cmdline'] or ())
+                        cmdline = ' '.join(argv)
+                        for key in [key for key in missing if self._matches(key, argv, cmdline)]:
+                            missing.discard(key)
+                            self._pids[key] = (proc.info['pid'], proc.info['create_time'])
+                            found[key] = proc.info['create_time']
+                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                        pass
+                    if not missing:
+                        break
 
-    except subprocess.TimeoutExpired:
-        return {
-            'name': name,
-            'state': 'Timeout',
-            'uptime': 'N/A'
-        }
-    except subprocess.CalledProcessError:
-        return {
-            'name': name,
-            'state': 'Not Found',
-            'uptime': 'N/A'
-        }
-    except Exception as e:
-        return {
-            'name': name,
-            'state': f'Error: {str(e)}',
-            'uptime': 'N/A'
-        }
+            for key in missing:
+                found[key] = None
+            return found
 
 
-def get_uptime_alternative(service_name):
-    """Alternative method to get uptime using systemctl status"""
-    try:
-        result = subprocess.run(
-            ['systemctl', 'status', service_name],
-            capture_output=True,
-            text=True,
-            timeout=3
-        )
-
-        if result.returncode == 0:
-            output = result.stdout
-            # Look for the active line with time information
-            for line in output.split('\n'):
-                if 'Active: active (running)' in line:
-                    # Extract time information like "3 days, 12:34:56" or "12:34:56"
-                    time_match = re.search(r'(\d+ days, )?(\d+:\d+:\d+)', line)
-                    if time_match:
-                        return time_match.group(0).replace(' days, ', ' days ')
-
-        return 'N/A'
-    except:
-        return 'N/A'
+process_index = ProcessIndex()
 
 
-def check_process_running(process_cmd, name):
+def check_processes_running(process_list):
     """
-    Check if a process with the given command is running
+    Check several processes with a single process table lookup
     
     Args:
-        process_cmd (str): Process command to check (e.g., 'python3 bot.py')
+        process_list (list): List of [matcher, display name] pairs, see ProcessIndex
         
     Returns:
-        dict: Dictionary containing process name, state, and uptime
+        list: List of dictionaries containing process name, state, and uptime
     """
     try:
-        # Check all running processes
-        running = False
-        uptime_seconds = 0
-        process_name = process_cmd
-        current_time = time.time()
-
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'create_time']):
-            try:
-                # Check if the process command matches
-                cmdline = ' '.join(proc.info['cmdline'] or [])
-                if process_cmd in cmdline:
-                    running = True
-                    # Calculate uptime
-                    create_time = proc.info['create_time']
-                    uptime_seconds = current_time - create_time
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-
-        if running:
-            # Convert uptime to human readable format
-            uptime = str(timedelta(seconds=int(uptime_seconds)))
-            # Remove milliseconds if present
-            if '.' in uptime:
-                uptime = uptime.split('.')[0]
-
-            return {
+        create_times = process_index.lookup([process for process, _ in process_list])
+    except Exception as e:
+        return [{
+            'name': name,
+            'state': f'Error: {str(e)}',
+            'uptime': 'N/A',
+            'type': 'process'
+        } for _, name in process_list]
+
+    current_time = time.time()
+    results = []
+    for process, name in process_list:
+        create_time = create_times[ProcessIndex._key(process)]
+        if create_time is not None:
+            results.append({
                 'name': name,
                 'state': 'Active',
-                'uptime': uptime,
+                'uptime': format_uptime(current_time - create_time),
                 'type': 'process'
-            }
+            })
         else:
-            return {
+            results.append({
                 'name': name,
                 'state': 'Not Running',
                 'uptime': 'N/A',
                 'type': 'process'
-            }
+            })
+    return results
 
-    except Exception as e:
-        return {
-            'name': name,
-            'state': f'Error: {str(e)}',
-            'uptime': 'N/A',
-            'type': 'process'
-        }
+
+def check_process_running(process_cmd, name):
+    """
+    Check if a process with the given command is running
+    
+    Args:
+        process_cmd (str): Process command to check (e.g., 'python3 bot.py')
+        
+    Returns:
+        dict: Dictionary containing process name, state, and uptime
+    """
+    return check_processes_running([[process_cmd, name]])[0]
 
 
-def check_multiple_services(service_list, process_list):
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='probe')
+    return _executor
+
+
+def check_multiple_services(service_list, process_list, probe_timeout=PROBE_TIMEOUT, deadline=PROBE_DEADLINE):
     """
-    Check status of multiple services
+    Check status of multiple services concurrently
     
     Args:
-        service_list (list): List of service names to check
+        service_list (list): List of [service name, display name] pairs
+        process_list (list): List of [process command, display name] pairs
+        probe_timeout (float): Timeout for a single probe in seconds
+        deadline (float): Time budget for all probes together in seconds
         
     Returns:
-        list: List of dictionaries with service status information
+        list: List of dictionaries with service status information, probes
+        that did not finish in time are reported with state 'Timeout'
     """
+    executor = _get_executor()
+    end = time.monotonic() + deadline
+    # All systemd units are read by a single systemctl call
+    probes = [(
+        executor.submit(get_services_status, service_list, probe_timeout),
+        [{'name': name, 'state': 'Timeout', 'uptime': 'N/A'} for _, name in service_list]
+    )]
+    # All watched processes are found by one pass over the process table
+    probes.append((
+        executor.submit(check_processes_running, process_list),
+        [{'name': name, 'state': 'Timeout', 'uptime': 'N/A', 'type': 'process'} for _, name in process_list]
+    ))
+
     results = []
-    for service, name in service_list:
-        results.append(get_service_status(service, name))
-    for process, name in process_list:
-        results.append(check_process_running(process, name))
+    for future, timeout_result in probes:
+        try:
+            result = future.result(timeout=max(0, end - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            result = timeout_result
+        if isinstance(result, list):
+            results.extend(result)
+        else:
+            results.append(result)
     return results
@@ -1,10 +1,10 @@
-import os
-import json
 from datetime import datetime
-from telegram import Update, Bot
+from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 import logging
-from config import NEWS_BOT_TOKEN, NEWS_JSON_FILE, NEWS_CHANNEL_ID, ADMIN_CHAT_ID
+from config import NEWS_JSON_FILE, NEWS_LOG_FILE, ConfigError, settings
+from shared.newsstore import NewsStore
+from website.newsbot.outbox import ChannelOutbox
 
 # Configure logging
 logging.basicConfig(
@@ -13,33 +13,19 @@ logging.basicConfig(
 )
 
 
-# Load existing news
-def load_news():
-    if os.path.exists(NEWS_JSON_FILE):
-        with open(NEWS_JSON_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-
-# Save news to JSON
-def save_news(news_list):
-    with open(NEWS_JSON_FILE, 'w', encoding='utf-8') as f:
-        json.dump(news_list, f, ensure_ascii=False, indent=2)
+# News log, news.json is imported on the first write if the log doesn't exist yet
+news_store = NewsStore(NEWS_LOG_FILE, legacy_path=NEWS_JSON_FILE)
+LIST_PAGE_SIZE = 10
 
 
 # Check if user is authorized
 def is_authorized(chat_id):
-    return chat_id == ADMIN_CHAT_ID
+    return chat_id == settings.newsbot.admin_chat_id
 
 
 # Store message IDs for deletion
 def save_message_id(news_id, message_id):
-    news_list = load_news()
-    for news in news_list:
-        if news['id'] == news_id:
-            news['channel_message_id'] = message_id
-            break
-    save_news(news_list)
+    news_store.update(news_id, channel_message_id=message_id)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -51,8 +37,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Бот новостей CUCnet-а!\n"
         "Команды:\n"
         "/news - Добавить новость(Нужно ответить!)\n"
-        "/list - Список новостей(да ладно0\n"
-        "/delete <id> - Удалить новость по айдишнику(из канала тоже удалит дада)"
+        "/list - Список новостей(да ладно0, /list <курсор> - следующая страница\n"
+        "/delete <id> [<id> ...] - Удалить новости по айдишникам(из канала тоже удалит дада)"
     )
 
 
@@ -73,27 +59,18 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.user_data.get('waiting_for_news'):
         # This is a news message
         news_text = update.message.text
-        news_list = load_news()
 
         # Create news entry
-        news_id = len(news_list) + 1
-        news_entry = {
-            "id": news_id,
+        news_entry = news_store.add({
             "text": news_text,
             "date": datetime.now().strftime("%Y-%m-%d"),
             "timestamp": datetime.now().isoformat()
-        }
-
-        news_list.append(news_entry)
-        save_news(news_list)
+        })
+        news_id = news_entry['id']
 
         # Post to channel
         try:
-            bot = Bot(token=NEWS_BOT_TOKEN)
-            message = await bot.send_message(
-                chat_id=NEWS_CHANNEL_ID,
-                text=f"[{news_entry['date']}]: {news_text}"
-            )
+            message = await context.bot_data['outbox'].post(f"[{news_entry['date']}]: {news_text}")
             # Save the channel message ID for future deletion
             save_message_id(news_id, message.message_id)
 
@@ -109,18 +86,25 @@ async def list_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Неавторизованный доступ!! 403!!! get dunked on!")
         return
 
-    news_list = load_news()
+    cursor = context.args[0] if context.args else None
+    try:
+        news_list, next_cursor = news_store.page(cursor, LIST_PAGE_SIZE)
+    except ValueError:
+        await update.message.reply_text("Кривой курсор, начни с /list")
+        return
 
     if not news_list:
         await update.message.reply_text("Новостей нету.")
         return
 
     response = "📰 News List:\n\n"
-    for news in news_list[-10:]:  # Show last 10 news
+    for news in news_list:
         response += f"ID: {news['id']}\n"
         response += f"Дата: {news['date']}\n"
         response += f"{news['text'][:100]}...\n"
         response += "─" * 30 + "\n"
+    if next_cursor:
+        response += f"Дальше: /list {next_cursor}"
 
     await update.message.reply_text(response)
 
@@ -131,57 +115,70 @@ async def delete_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if not context.args:
-        await update.message.reply_text("Использование: /delete <news_id>")
+        await update.message.reply_text("Использование: /delete <news_id> [<news_id> ...]")
         return
 
     try:
-        news_id = int(context.args[0])
-        news_list = load_news()
-
-        # Find news to delete
-        news_to_delete = None
-        for news in news_list:
-            if news['id'] == news_id:
-                news_to_delete = news
-                break
+        news_ids = list(dict.fromkeys(int(arg) for arg in context.args))
+    except ValueError:
+        await update.message.reply_text("Дай мне валидный ID(int).")
+        return
 
-        if not news_to_delete:
+    news_to_delete = []
+    for news_id in news_ids:
+        news = news_store.get(news_id)
+        if news:
+            news_to_delete.append(news)
+        else:
             await update.message.reply_text(f"Новость с ID {news_id} не найдена. 404!")
-            return
-
-        # Delete from channel if message ID exists
-        if news_to_delete.get('channel_message_id'):
-            try:
-                bot = Bot(token=NEWS_BOT_TOKEN)
-                await bot.delete_message(
-                    chat_id=NEWS_CHANNEL_ID,
-                    message_id=news_to_delete['channel_message_id']
-                )
-            except Exception as e:
-                logging.error(f"Ошибка удаление новочтей с канала: {e}")
-                await update.message.reply_text(f"Новость удалена но не с канала: {e}")
-
-        # Remove from news list
-        news_list = [news for news in news_list if news['id'] != news_id]
-
-        # Reindex IDs
-        for i, news in enumerate(news_list, 1):
-            news['id'] = i
-
-        save_news(news_list)
-        await update.message.reply_text(f"Новость с ID {news_id} успешно удалена.")
+    if not news_to_delete:
+        return
+
+    # Delete from channel if message IDs exist, in one request when there are several
+    message_ids = [news['channel_message_id'] for news in news_to_delete if news.get('channel_message_id')]
+    if message_ids:
+        results = await context.bot_data['outbox'].delete_many(message_ids)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logging.error(f"Ошибка удаление новочтей с канала: {errors[0]}")
+            await update.message.reply_text(f"Новость удалена но не с канала: {errors[0]}")
+
+    # Remove from news list, ids of other news stay the same
+    for news in news_to_delete:
+        news_store.delete(news['id'])
+    deleted = ', '.join(str(news['id']) for news in news_to_delete)
+    if len(news_to_delete) == 1:
+        await update.message.reply_text(f"Новость с ID {deleted} успешно удалена.")
+    else:
+        await update.message.reply_text(f"Новости с ID {deleted} успешно удалены.")
 
-    except ValueError:
-        await update.message.reply_text("Дай мне валидный ID(int).")
+
+async def start_outbox(application: Application):
+    # Channel operations reuse the application's bot and its connection pool
+    outbox = ChannelOutbox(application.bot, settings.newsbot.channel_id)
+    outbox.start()
+    application.bot_data['outbox'] = outbox
+
+
+async def stop_outbox(application: Application):
+    await application.bot_data['outbox'].stop()
 
 
 def main():
     # Validate environment variables
-    if not all([NEWS_BOT_TOKEN, ADMIN_CHAT_ID, NEWS_CHANNEL_ID]):
-        logging.error("Missing required environment variables. Please check your .env file.")
+    try:
+        newsbot_settings = settings.newsbot
+    except ConfigError as e:
+        logging.error(f"Invalid configuration: {e}")
         return
 
-    application = Application.builder().token(NEWS_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(newsbot_settings.token)
+        .post_init(start_outbox)
+        .post_shutdown(stop_outbox)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+import httpx
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+# Telegram allows about 20 messages per minute in one channel
+MIN_INTERVAL = 3.0
+MAX_RETRIES = 5
+MAX_DELETE_BATCH = 100
+
+
+def not_sent(error):
+    """Check whether a network error happened before the request reached Telegram"""
+    return isinstance(error.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+class ChannelOutbox:
+    """
+    Queue for channel posts and deletes sent through one shared Bot
+
+    Requests go out one at a time with at least `min_interval` seconds
+    between them, flood-control errors are retried after the delay Telegram
+    asks for. Posts are only retried after network errors when the request
+    never reached Telegram, so a post is not published twice. Deletes queued together by `delete_many` go out as one
+    delete_messages call.
+    """
+
+    def __init__(self, bot, chat_id, min_interval=MIN_INTERVAL, max_retries=MAX_RETRIES):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self._queue = asyncio.Queue()
+        self._pending = None
+        self._task = None
+
+    def start(self):
+        """Start the sending loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the sending loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def post(self, text):
+        """Queue a channel post and return the sent Message"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(('post', text, future))
+        return await future
+
+    async def delete(self, message_id):
+        """Queue deletion of a channel message"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(('delete', message_id, future))
+        return await future
+
+    async def delete_many(self, message_ids):
+        """
+        Queue deletion of several channel messages at once
+
+        Returns:
+            list: Result or exception for each message id, in order
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        # Queued without awaiting in between, so the sender sees them as one batch
+        for message_id in message_ids:
+            future = loop.create_future()
+            self._queue.put_nowait(('delete', message_id, future))
+            futures.append(future)
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def _next(self):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+            return item
+        return await self._queue.get()
+
+    def _collect_deletes(self, first):
+        batch = [first]
+        while len(batch) < MAX_DELETE_BATCH and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item[0] != 'delete':
+                self._pending = item
+                break
+            batch.append(item)
+        return batch
+
+    async def _call(self, method, *args, idempotent=True, done_if_missing=False, **kwargs):
+        """
+        Call a Bot method, retrying failed requests up to `max_retries` times
+
+        Args:
+            method: Bot method
+            idempotent (bool): Retry network errors even when the request may have reached Telegram
+            done_if_missing (bool): A "not found" error on a retry means an earlier attempt went through
+        """
+        delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await method(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logging.warning(f"Flood control, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+            except BadRequest as e:
+                if attempt > 0 and done_if_missing and 'not found' in e.message.lower():
+                    return True
+                raise
+            except NetworkError as e:
+                if attempt == self.max_retries or not (idempotent or not_sent(e)):
+                    raise
+                logging.warning(f"Telegram request failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    async def _send(self, item):
+        kind, payload, future = item
+        if kind == 'post':
+            result = await self._call(self.bot.send_message, chat_id=self.chat_id, text=payload, idempotent=False)
+            if not future.done():
+                future.set_result(result)
+            return
+
+        batch = self._collect_deletes(item)
+        if len(batch) == 1:
+            result = await self._call(
+                self.bot.delete_message, chat_id=self.chat_id, message_id=payload, done_if_missing=True
+            )
+            if not future.done():
+                future.set_result(result)
+            return
+
+        try:
+            result = await self._call(
+                self.bot.delete_messages,
+                chat_id=self.chat_id,
+                message_ids=[message_id for _, message_id, _ in batch],
+                done_if_missing=True
+            )
+        except Exception as e:
+            for _, _, batch_future in batch:
+                if not batch_future.done():
+                    batch_future.set_exception(e)
+            return
+        for _, _, batch_future in batch:
+            if not batch_future.done():
+                batch_future.set_result(result)
+
+    async def _run(self):
+        while True:
+            item = await self._next()
+            try:
+                await self._send(item)
+            except Exception as e:
+                future = item[2]
+                if not future.done():
+                    future.set_exception(e)
+            await asyncio.sleep(self.min_interval)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+
+class NewsCache:
+    """
+    In-memory view of the news store, sorted newest first
+
+    The store is asked for new records at most once per `check_interval`
+    and the lists are rebuilt only when something changed, so serving the
+    front page costs a dictionary lookup instead of a read.
+    """
+
+    def __init__(self, store, top_n=7, check_interval=1.0):
+        self.store = store
+        self.top_n = top_n
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._top = []
+        self._rebuild()
+
+    def _rebuild(self):
+        self._top, _ = self.store.page(limit=self.top_n)
+
+    def refresh(self, force=False):
+        """Pick up changes written by the news bot"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            if self.store.refresh() or force:
+                self._rebuild()
+
+    def latest(self):
+        """Return the newest `top_n` entries"""
+        self.refresh()
+        return self._top
+
+    def all(self):
+        """Return every entry, newest first"""
+        self.refresh()
+        return self.store.page(limit=len(self.store))[0]
+
+    def page(self, cursor=None, limit=10):
+        """Return a page of entries and the next cursor, see NewsStore.page"""
+        self.refresh()
+        return self.store.page(cursor, limit)
+
+    @property
+    def version(self):
+        """News store version, changes only when news are added or deleted"""
+        self.refresh()
+        return self.store.version
+
+    @property
+    def updated_at(self):
+        """Unix time of the last add or delete"""
+        self.refresh()
+        return self.store.updated_at
@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate
+
+from jinja2 import meta
+from markupsafe import Markup
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(headers):
+    """Return the content codings accepted by the client sending `headers`"""
+    encodings = set()
+    for item in headers.get('accept-encoding', '').split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+def etag_matches(request, etag):
+    """Check an If-None-Match header against an ETag"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in header.split(',')]
+    return etag in tags or ('W/' + etag) in tags
+
+
+class CachedPage:
+    """Rendered page with its compressed variants and ETags"""
+
+    def __init__(self, body, signature, key=None, last_modified=None):
+        self.signature = signature
+        self.key = key
+        self.last_modified = formatdate(last_modified, usegmt=True) if last_modified else None
+        self.checked_at = 0.0
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        if key is not None:
+            digest = f'{key}-{digest[:16]}'
+        self.variants = {None: (body, f'"{digest}"')}
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+
+    def response(self, request, status_code=200, headers=None):
+        encodings = accepted_encodings(request.headers)
+        encoding = None
+        if 'br' in self.variants and 'br' in encodings:
+            encoding = 'br'
+        elif 'gzip' in encodings:
+            encoding = 'gzip'
+        body, etag = self.variants[encoding]
+
+        headers = dict(headers or {})
+        headers['ETag'] = etag
+        headers['Vary'] = 'Accept-Encoding'
+        if self.last_modified:
+            headers['Last-Modified'] = self.last_modified
+        if etag_matches(request, etag) or (
+                self.last_modified and 'if-none-match' not in request.headers
+                and request.headers.get('if-modified-since') == self.last_modified):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(content=body, status_code=status_code, media_type='text/html', headers=headers)
+
+
+class CachedFragment:
+    """Rendered template fragment"""
+
+    def __init__(self, markup, signature, key=None):
+        self.markup = markup
+        self.signature = signature
+        self.key = key
+        self.checked_at = 0.0
+
+
+class PageCache:
+    """
+    Cache of fully rendered template pages
+
+    A page is rendered once and kept as bytes together with gzip/brotli
+    variants. It is re-rendered when the template or any template it
+    extends or includes changes on disk; files are checked at most once
+    per `check_interval` seconds. Pages and fragments rendered from
+    changing data pass a `key` (e.g. the news version) and are re-rendered
+    when it changes.
+
+    Args:
+        templates: Jinja2Templates to render with
+        check_interval (float): Seconds between checks of the template files
+        dependencies (list): Other files every page depends on, e.g. the asset manifest
+    """
+
+    def __init__(self, templates, check_interval=1.0, dependencies=()):
+        self.env = templates.env
+        self.check_interval = check_interval
+        self.dependencies = list(dependencies)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._fragments = {}
+        self._dependencies = {}
+
+    def _template_files(self, name, seen=None):
+        if seen is None:
+            seen = {}
+        if name in seen:
+            return seen
+        source, filename, _ = self.env.loader.get_source(self.env, name)
+        seen[name] = filename
+        for referenced in meta.find_referenced_templates(self.env.parse(source)):
+            if referenced:
+                self._template_files(referenced, seen)
+        return seen
+
+    def _signature(self, name, embeds=()):
+        files = self._dependencies.get(name)
+        if files is None:
+            templates = self._template_files(name)
+            for embedded in embeds:
+                self._template_files(embedded, templates)
+            files = sorted(set(templates.values())) + self.dependencies
+            self._dependencies[name] = files
+        signature = []
+        for filename in files:
+            try:
+                signature.append(os.stat(filename).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _is_fresh(self, name, cached, key, now, embeds=()):
+        if cached is None or cached.key != key:
+            return False
+        if now - cached.checked_at < self.check_interval:
+            return True
+        signature = self._signature(name, embeds)
+        if cached.signature != signature:
+            # A template changed, its includes may have changed too
+            self._dependencies.pop(name, None)
+            return False
+        cached.checked_at = now
+        return True
+
+    def get(self, name, context, key=None, last_modified=None, embeds=()):
+        """
+        Get the rendered page for a template
+
+        Args:
+            name (str): Template name
+            context (dict): Template context, must not depend on the request
+            key: Version of the data the context was built from
+            last_modified (float): Unix time of the last data change, Last-Modified is the
+                later of it and the newest template or dependency file
+            embeds (tuple): Fragment templates rendered into the context, the page changes with them
+
+        Returns:
+            CachedPage: Rendered page
+        """
+        now = time.monotonic()
+        page = self._pages.get(name)
+        if self._is_fresh(name, page, key, now, embeds):
+            return page
+        with self._lock:
+            page = self._pages.get(name)
+            if not self._is_fresh(name, page, key, now, embeds):
+                signature = self._signature(name, embeds)
+                body = self.env.get_template(name).render(context).encode('utf-8')
+                if last_modified is not None:
+                    files_modified = max((mtime for mtime in signature if mtime is not None), default=0)
+                    last_modified = max(last_modified, files_modified / 1e9)
+                page = CachedPage(body, signature, key, last_modified)
+                page.checked_at = now
+                self._pages[name] = page
+            return page
+
+    def fragment(self, name, context, key=None):
+        """Get a rendered template fragment as markup to embed in a page"""
+        now = time.monotonic()
+        fragment = self._fragments.get(name)
+        if self._is_fresh(name, fragment, key, now):
+            return fragment.markup
+        with self._lock:
+            fragment = self._fragments.get(name)
+            if not self._is_fresh(name, fragment, key, now):
+                signature = self._signature(name)
+                fragment = CachedFragment(Markup(self.env.get_template(name).render(context)), signature, key)
+                fragment.checked_at = now
+                self._fragments[name] = fragment
+            return fragment.markup
+
+    def response(self, request, name, context, key=None, last_modified=None, embeds=(), status_code=200,
+                 headers=None):
+        """Serve a cached template page, answering If-None-Match with 304"""
+        return self.get(name, context, key, last_modified, embeds).response(request, status_code, headers)
@@ -0,0 +1,217 @@
+import ipaddress
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+
+class LRUTable:
+    """Dictionary that forgets the least recently used keys above `max_entries`"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def pop(self, key):
+        return self._items.pop(key, None)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SQLiteBanStore:
+    """
+    Bans shared between worker processes through a SQLite table
+
+    Only bans go through the database, token buckets stay per process.
+    The calls block, RateLimiter makes them from its own worker thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=1.0, check_same_thread=False)
+        self._conn.execute('PRAGMA busy_timeout = 1000')
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_bans ('
+                'client TEXT PRIMARY KEY, banned_until REAL NOT NULL)'
+            )
+
+    def ban(self, client, banned_until):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO rate_limit_bans (client, banned_until) VALUES (?, ?) '
+                'ON CONFLICT(client) DO UPDATE SET banned_until = excluded.banned_until',
+                (client, banned_until)
+            )
+
+    def active_bans(self, now):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM rate_limit_bans WHERE banned_until <= ?', (now,))
+            return dict(self._conn.execute('SELECT client, banned_until FROM rate_limit_bans'))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RateLimiter:
+    """
+    Per-client token buckets plus strikes for scanner traffic
+
+    Every request takes one token from the client's bucket, which refills
+    at `rate` tokens per second up to `burst`. Requests to blocked paths
+    count as strikes; a client with `max_strikes` strikes within
+    `strike_window` seconds is banned for `ban_time` seconds.
+    All state lives in bounded LRU tables, so memory stays flat under
+    spoofed or rotating addresses.
+
+    Store reads and writes run on a single background thread and never
+    delay a request. If the store fails, the shared bans are left as they
+    are and the error is logged.
+
+    Args:
+        rate (float): Sustained requests per second per client
+        burst (int): Bucket size
+        max_strikes (int): Blocked path hits before a ban
+        strike_window (float): Seconds strikes are remembered
+        ban_time (float): Ban duration in seconds
+        max_clients (int): Size of each LRU table
+        store (SQLiteBanStore): Optional ban store shared by workers
+        sync_interval (float): Seconds between reads of the shared bans
+    """
+
+    def __init__(self, rate=10.0, burst=40, max_strikes=3, strike_window=600.0, ban_time=3600.0,
+                 max_clients=10000, store=None, sync_interval=5.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_strikes = max_strikes
+        self.strike_window = strike_window
+        self.ban_time = ban_time
+        self.store = store
+        self.sync_interval = sync_interval
+        self._buckets = LRUTable(max_clients)
+        self._strikes = LRUTable(max_clients)
+        self._bans = LRUTable(max_clients)
+        self._shared_bans = {}
+        self._synced_at = 0.0
+        self._syncing = False
+        self._store_executor = None
+        if store is not None:
+            self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ban-store')
+
+    def allow(self, client, now=None):
+        """Take a token for a request, returns False if the client is over its rate"""
+        if now is None:
+            now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            self._buckets.set(client, [self.burst - 1.0, now])
+            return True
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1.0
+        return True
+
+    def is_banned(self, client, now=None):
+        """Check whether the client is banned"""
+        if now is None:
+            now = time.time()
+        self._sync(now)
+        banned_until = self._bans.get(client)
+        if banned_until is not None and banned_until <= now:
+            self._bans.pop(client)
+            banned_until = None
+        if banned_until is None:
+            # Bans from other workers, replaced as a whole by each sync
+            banned_until = self._shared_bans.get(client)
+        return banned_until is not None and banned_until > now
+
+    def strike(self, client, now=None):
+        """
+        Record a request to a blocked path
+
+        Returns:
+            bool: True if the client got banned by this strike
+        """
+        if now is None:
+            now = time.time()
+        strikes = self._strikes.get(client)
+        if strikes is None or now - strikes[1] > self.strike_window:
+            strikes = [0, now]
+            self._strikes.set(client, strikes)
+        strikes[0] += 1
+        strikes[1] = now
+        if strikes[0] < self.max_strikes:
+            return False
+
+        self._strikes.pop(client)
+        banned_until = now + self.ban_time
+        self._bans.set(client, banned_until)
+        if self.store is not None:
+            self._store_executor.submit(self._store_ban, client, banned_until)
+        return True
+
+    def _store_ban(self, client, banned_until):
+        try:
+            self.store.ban(client, banned_until)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not store ban of {client}: {e}")
+
+    def _load_bans(self, now):
+        try:
+            self._shared_bans = self.store.active_bans(now)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not read shared bans: {e}")
+        finally:
+            self._syncing = False
+
+    def _sync(self, now):
+        if self.store is None or self._syncing or now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        self._syncing = True
+        self._store_executor.submit(self._load_bans, now)
+
+
+@lru_cache(maxsize=4096)
+def _parse_address(client):
+    try:
+        return ipaddress.ip_address(client)
+    except ValueError:
+        return None
+
+
+class TrustedClients:
+    """
+    Addresses that are never rate limited or banned, e.g. the reverse proxy
+
+    Args:
+        networks (list): Addresses or CIDR networks
+    """
+
+    def __init__(self, networks):
+        self.networks = [ipaddress.ip_network(network, strict=False) for network in networks]
+
+    def __contains__(self, client):
+        address = _parse_address(client)
+        return address is not None and any(address in network for network in self.networks)
@@ -0,0 +1,170 @@
+import asyncio
+from collections import deque
+
+from starlette.datastructures import MutableHeaders
+
+DEFAULT_BLOCKED_PATHS = ['.git', '.env', 'wp-', 'admin', 'http://', 'https://']
+
+SECURITY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+}
+
+
+def load_blocklist(path=None):
+    """
+    Load blocked path fragments, one per line, '#' starts a comment
+
+    Args:
+        path (str): Blocklist file, the default list is used if None
+
+    Returns:
+        list: Path fragments to block
+    """
+    if not path:
+        return list(DEFAULT_BLOCKED_PATHS)
+    patterns = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                patterns.append(line)
+    return patterns
+
+
+class PathMatcher:
+    """
+    Aho-Corasick automaton that finds any of many substrings in one pass
+
+    Matching costs O(len(text)) no matter how many patterns are loaded.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._match = [False]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern):
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._match.append(False)
+            state = next_state
+        self._match[state] = True
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail if fail != next_state else 0
+                self._match[next_state] = self._match[next_state] or self._match[self._fail[next_state]]
+
+    def search(self, text):
+        """Return True if any pattern occurs in text"""
+        goto = self._goto
+        fail = self._fail
+        match = self._match
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if match[state]:
+                return True
+        return False
+
+
+class SecurityMiddleware:
+    """
+    ASGI middleware that blocks suspicious requests and adds security headers
+
+    Headers are inserted into the `http.response.start` message, so the
+    response body is passed through untouched, including streamed files.
+    Error replies are pre-rendered byte strings, junk traffic never
+    reaches the templates. With a RateLimiter, clients over their rate get
+    429 and banned scanners get a 404 after `tarpit_delay` seconds.
+    Trusted clients, like a reverse proxy whose forwarded headers were not
+    applied, are never limited, so one scanner can't get the proxy banned.
+
+    Args:
+        app: ASGI application
+        blocked_paths (list): Path fragments answered with 404
+        error_pages (dict): Status code to pre-rendered HTML body
+        limiter (RateLimiter): Optional per-client rate limiter
+        tarpit_delay (float): Delay before answering banned clients
+        trusted_clients (TrustedClients): Clients exempt from the limiter
+    """
+
+    def __init__(self, app, blocked_paths=None, error_pages=None, limiter=None, tarpit_delay=2.0,
+                 trusted_clients=()):
+        self.app = app
+        self.matcher = PathMatcher(DEFAULT_BLOCKED_PATHS if blocked_paths is None else blocked_paths)
+        self.error_pages = error_pages or {}
+        self.limiter = limiter
+        self.tarpit_delay = tarpit_delay
+        self.trusted_clients = trusted_clients
+
+    async def _send_error(self, send, status_code, extra_headers=()):
+        body = self.error_pages.get(status_code) or str(status_code).encode()
+        headers = [
+            (b'content-type', b'text/html; charset=utf-8'),
+            (b'content-length', str(len(body)).encode()),
+            *extra_headers
+        ]
+        headers.extend((name.lower().encode(), value.encode()) for name, value in SECURITY_HEADERS.items())
+        await send({'type': 'http.response.start', 'status': status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        client = scope['client'][0] if scope.get('client') else ''
+        limiter = None if client in self.trusted_clients else self.limiter
+        if limiter is not None:
+            if limiter.is_banned(client):
+                await asyncio.sleep(self.tarpit_delay)
+                await self._send_error(send, 404)
+                return
+            if not limiter.allow(client):
+                await self._send_error(send, 429, [(b'retry-after', b'1')])
+                return
+
+        # Block CONNECT method
+        if scope['method'] == 'CONNECT':
+            await self._send_error(send, 405)
+            return
+
+        # Block suspicious paths
+        if self.matcher.search(scope['path']):
+            if limiter is not None:
+                limiter.strike(client)
+            await self._send_error(send, 404)
+            return
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                for name, value in SECURITY_HEADERS.items():
+                    headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
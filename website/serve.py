@@ -0,0 +1,97 @@
+"""
+Production server
+
+`python -m website.serve` runs the site with WEB_WORKERS uvicorn worker
+processes (all cores by default) on WEB_HOST:WEB_PORT. uvloop and
+httptools are used when installed. The supervisor restarts workers that
+die, and `kill -HUP <pid>` replaces all workers one by one without
+closing the listening socket, e.g. after a deploy.
+
+Workers share their state through files in a private run directory:
+one worker probes the services and the others read its snapshots, and
+rate limit bans are kept in one SQLite database. The directory is
+RUN_DIR, systemd's RUNTIME_DIRECTORY, $XDG_RUNTIME_DIR/cucnet or a fresh
+temporary one, in that order. It must be owned by the server user and
+not writable by anyone else.
+"""
+import argparse
+import os
+import shutil
+import stat
+import tempfile
+
+import uvicorn
+
+from config import settings
+
+APP = 'website.app:app'
+
+
+def runtime_file(run_dir, port, name):
+    return os.path.join(run_dir, f'cucnet-{port}-{name}')
+
+
+def private_run_dir(path=None):
+    """
+    Find or create the directory for the files shared by the workers
+
+    Args:
+        path (str): Directory to use, picked from the environment if None
+
+    Returns:
+        tuple: (directory, True if it is temporary and should be removed on exit)
+    """
+    if path is None and os.getenv('RUNTIME_DIRECTORY'):
+        path = os.getenv('RUNTIME_DIRECTORY').split(':')[0]
+    if path is None and os.getenv('XDG_RUNTIME_DIR'):
+        path = os.path.join(os.getenv('XDG_RUNTIME_DIR'), 'cucnet')
+    if path is None:
+        return tempfile.mkdtemp(prefix='cucnet-'), True
+
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise SystemExit(f"Run directory {path} must be owned by this user and not writable by others")
+    return path, False
+
+
+def main():
+    web = settings.web
+    parser = argparse.ArgumentParser(description="Run the CUCnet website")
+    parser.add_argument('--host', default=web.host)
+    parser.add_argument('--port', type=int, default=web.port)
+    parser.add_argument('--workers', type=int, default=web.workers)
+    parser.add_argument('--run-dir', default=os.getenv('RUN_DIR'),
+                        help="Private directory for the files shared by the workers")
+    parser.add_argument('--reload', action='store_true', help="Single worker that reloads on code changes")
+    args = parser.parse_args()
+
+    workers = 1 if args.reload else max(1, args.workers)
+    run_dir, temporary = None, False
+    if workers > 1:
+        run_dir, temporary = private_run_dir(args.run_dir)
+        # Read by website.app in every worker, explicit settings win
+        os.environ.setdefault('STATUS_SHARED_FILE', runtime_file(run_dir, args.port, 'status.json'))
+        os.environ.setdefault('RATE_LIMIT_DB', runtime_file(run_dir, args.port, 'bans.db'))
+
+    try:
+        uvicorn.run(
+            APP,
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            reload=args.reload,
+            loop='auto',
+            http='auto',
+            timeout_graceful_shutdown=web.graceful_timeout,
+            # Client addresses come from X-Forwarded-For only when sent by a trusted proxy
+            proxy_headers=True,
+            forwarded_allow_ips=','.join(web.trusted_proxies),
+        )
+    finally:
+        if temporary:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
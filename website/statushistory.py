@@ -0,0 +1,104 @@
+import json
+import hashlib
+from array import array
+from collections import deque
+
+DAY = 24 * 3600
+WEEK = 7 * DAY
+
+
+class ServiceHistory:
+    """Fixed-size ring buffer with the sampled states of one service"""
+
+    def __init__(self, capacity, max_transitions=10):
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.up = array('b', [0]) * capacity
+        self.size = 0
+        self.head = 0
+        self.state = None
+        self.transitions = deque(maxlen=max_transitions)
+
+    def add(self, timestamp, state):
+        """Store one sample, overwriting the oldest one when full"""
+        self.times[self.head] = timestamp
+        self.up[self.head] = 1 if state == 'Active' else 0
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+        if state != self.state:
+            if self.state is not None:
+                self.transitions.append({'at': timestamp, 'from': self.state, 'to': state})
+            self.state = state
+
+    def availability(self, since):
+        """Percentage of samples taken after `since` in which the service was active"""
+        total = 0
+        up = 0
+        # Walk from the newest sample back until the window is left
+        for i in range(self.size):
+            index = (self.head - 1 - i) % self.capacity
+            if self.times[index] < since:
+                break
+            total += 1
+            up += self.up[index]
+        if not total:
+            return None
+        return round(100.0 * up / total, 2)
+
+
+class StatusHistory:
+    """
+    Sample history for every monitored service
+
+    `document` returns the /status.json body for a snapshot; it is built
+    once per snapshot so pollers only pay for a cached bytes lookup.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.services = {}
+        self._document = (None, b'', '')
+
+    def record(self, snapshot):
+        """Add the states of a StatusSnapshot to the history"""
+        for service in snapshot.services:
+            history = self.services.get(service['name'])
+            if history is None:
+                history = self.services[service['name']] = ServiceHistory(self.capacity)
+            history.add(snapshot.updated_at, service['state'])
+
+    def document(self, snapshot):
+        """
+        Build the JSON status document for a snapshot
+
+        Returns:
+            tuple: Encoded JSON body and its strong ETag
+        """
+        cached_snapshot, body, etag = self._document
+        if cached_snapshot is snapshot:
+            return body, etag
+
+        now = snapshot.updated_at or 0
+        services = []
+        for service in snapshot.services:
+            history = self.services.get(service['name'])
+            services.append({
+                'name': service['name'],
+                'state': service['state'],
+                'uptime': service['uptime'],
+                'availability': {
+                    '24h': history.availability(now - DAY) if history else None,
+                    '7d': history.availability(now - WEEK) if history else None
+                },
+                'transitions': list(history.transitions) if history else []
+            })
+        body = json.dumps({
+            'updated_at': snapshot.updated_at,
+            'active': snapshot.active,
+            'total': snapshot.total,
+            'services': services
+        }, ensure_ascii=False).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self._document = (snapshot, body, etag)
+        return body, etag
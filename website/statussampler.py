@@ -0,0 +1,145 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from website.getservice import check_multiple_services
+
+StatusSnapshot = namedtuple('StatusSnapshot', ['services', 'active', 'total', 'updated_at'])
+
+# Followers check the shared snapshot file at least this often, in seconds
+FOLLOW_INTERVAL = 5.0
+
+
+def make_snapshot(services_status, updated_at=None):
+    """Freeze a list of service status dicts into a StatusSnapshot"""
+    services = tuple(MappingProxyType(dict(service)) for service in services_status)
+    active = sum(1 for service in services if service['state'] == 'Active')
+    return StatusSnapshot(services, active, len(services), updated_at)
+
+
+class StatusSampler:
+    """
+    Refreshes service states in the background
+
+    Routes read `snapshot`, which is replaced as a whole after every
+    refresh, so rendering never waits for systemctl or psutil.
+
+    With `shared_path`, several worker processes share one sampler: the
+    worker holding a lock on `<shared_path>.lock` probes the services and
+    writes each snapshot to `shared_path`, the others read it from there.
+    If the leader exits, the lock is released and another worker takes over.
+    If the lock file can't be opened, the worker probes on its own.
+    """
+
+    def __init__(self, service_list, process_list, interval=30, history=None, shared_path=None):
+        self.service_list = service_list
+        self.process_list = process_list
+        self.interval = interval
+        self.history = history
+        self.shared_path = shared_path
+        self._task = None
+        self._lock_file = None
+        self._shared_mtime = None
+        self.snapshot = make_snapshot(
+            [{'name': name, 'state': 'Unknown', 'uptime': 'N/A'}
+             for _, name in list(service_list) + list(process_list)]
+        )
+
+    async def refresh(self):
+        """Probe all services once and publish a new snapshot"""
+        services_status = await asyncio.to_thread(
+            check_multiple_services, self.service_list, self.process_list
+        )
+        snapshot = make_snapshot(services_status, time.time())
+        if self.history is not None:
+            self.history.record(snapshot)
+        self.snapshot = snapshot
+        return snapshot
+
+    @property
+    def is_leader(self):
+        """Whether this process probes the services itself"""
+        return self.shared_path is None or self._lock_file is not None
+
+    def _try_lead(self):
+        try:
+            lock_file = open(self.shared_path + '.lock', 'a')
+        except OSError as e:
+            logging.error(f"Can't open the status lock file ({e}), probing services in this worker")
+            self.shared_path = None
+            return True
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _publish(self, snapshot):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.shared_path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'updated_at': snapshot.updated_at, 'services': [dict(s) for s in snapshot.services]}, f)
+            os.replace(tmp_path, self.shared_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _follow(self):
+        """Load the leader's snapshot if the shared file changed"""
+        try:
+            mtime = os.stat(self.shared_path).st_mtime_ns
+            if mtime == self._shared_mtime:
+                return
+            with open(self.shared_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        self._shared_mtime = mtime
+        if data['updated_at'] == self.snapshot.updated_at:
+            return
+        snapshot = make_snapshot(data['services'], data['updated_at'])
+        if self.history is not None:
+            self.history.record(snapshot)
+        self.snapshot = snapshot
+
+    async def _run(self):
+        while True:
+            try:
+                if self.is_leader or self._try_lead():
+                    snapshot = await self.refresh()
+                    if self.shared_path is not None:
+                        await asyncio.to_thread(self._publish, snapshot)
+                    delay = self.interval
+                else:
+                    self._follow()
+                    delay = min(self.interval, FOLLOW_INTERVAL)
+            except Exception as e:
+                logging.error(f"Status refresh failed: {e}")
+                delay = self.interval
+            await asyncio.sleep(delay)
+
+    def start(self):
+        """Start the refresh loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the refresh loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None